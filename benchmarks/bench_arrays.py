@@ -0,0 +1,55 @@
+"""Numeric list benchmark for the ``arrays`` mode of :py:class:`funconf.Config`.
+
+Casts strings of 1k, 10k and 100k numbers with the list caster and the
+array caster, and compares the memory held by the cast values.  NumPy
+arrays are included when NumPy is installed.
+
+Usage::
+
+    python benchmarks/bench_arrays.py [count ...]
+"""
+from __future__ import print_function
+import array
+import random
+import sys
+import time
+
+sys.path.insert(0, '.')
+import funconf
+
+
+def size(value):
+    "Return the bytes held by value and, for a list, its items."
+    if isinstance(value, list):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+    if funconf.numpy is not None and isinstance(value, funconf.numpy.ndarray):
+        return sys.getsizeof(value) + value.nbytes
+    return sys.getsizeof(value)
+
+
+def timed(caster, string, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        value = caster('weights', string)
+    return (time.time() - start) / repeat, value
+
+
+def main(*counts):
+    counts = counts or (1000, 10000, 100000)
+    defaults = [('list', [0]), ('array', array.array('q'))]
+    if funconf.numpy is not None:
+        defaults.append(('numpy', funconf.numpy.array([0])))
+    print("%8s %6s %10s %12s" % ('count', 'type', 'cast', 'memory'))
+    for count in counts:
+        string = ' '.join(str(random.randint(0, 1 << 40))
+                          for _ in range(count))
+        repeat = max(1, 100000 // count)
+        for name, default in defaults:
+            seconds, value = timed(funconf.caster_for(default), string,
+                                   repeat)
+            print("%8d %6s %8.2fms %10.1fKB" % (count, name, seconds * 1000,
+                                                size(value) / 1024.0))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
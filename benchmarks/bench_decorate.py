@@ -0,0 +1,60 @@
+"""Decoration benchmark for :py:class:`funconf.ConfigSection` decorators.
+
+Creates many distinct functions, as a plugin host would at import time,
+decorates each of them with a configuration section, then calls every
+decorated function once.
+
+Usage::
+
+    python benchmarks/bench_decorate.py [functions]
+"""
+from __future__ import print_function
+import sys
+import time
+
+sys.path.insert(0, '.')
+import funconf
+
+
+SOURCE = """
+def plugin_%d(host='localhost', port=80, debug=False, **k):
+    return port
+"""
+
+
+def make_functions(count):
+    namespace = {}
+    for i in range(count):
+        exec(SOURCE % i, namespace)
+    return [namespace['plugin_%d' % i] for i in range(count)]
+
+
+def main(count=10000):
+    config = funconf.Config()
+    config.set('plugin', 'port', 8080)
+    config.set('plugin', 'debug', True)
+    config.set('plugin', 'retries', 3)
+    functions = make_functions(count)
+
+    start = time.time()
+    decorated = [config.plugin(func) for func in functions]
+    decorate = time.time() - start
+
+    start = time.time()
+    for func in decorated:
+        func(port='81')
+    first_call = time.time() - start
+
+    start = time.time()
+    for func in decorated:
+        func(port='81')
+    call = time.time() - start
+
+    print("functions:  %d" % count)
+    print("decorate:   %.3fs (%.1fus each)" % (decorate, decorate / count * 1e6))
+    print("first call: %.3fs" % first_call)
+    print("call:       %.3fs" % call)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
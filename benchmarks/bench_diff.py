@@ -0,0 +1,49 @@
+"""Diff benchmark for :py:meth:`funconf.Config.diff`.
+
+Builds two configurations of many options that differ in a few options and
+times the first diff, which digests every section, and a repeated diff that
+reuses the cached digests of the unchanged sections.
+
+Usage::
+
+    python benchmarks/bench_diff.py [options] [sections]
+"""
+from __future__ import print_function
+import sys
+import time
+
+sys.path.insert(0, '.')
+import funconf
+
+
+def build(options, sections):
+    config = funconf.Config()
+    per_section = max(1, options // sections)
+    for i in range(options):
+        config.set("flags%d" % (i // per_section), "feature_%d" % i, i)
+    return config
+
+
+def main(options=100000, sections=200):
+    running = build(options, sections)
+    candidate = build(options, sections)
+    candidate.set('flags3', 'feature_1500', -1)
+    candidate.set('flags7', 'feature_3500', -1)
+
+    start = time.time()
+    diff = running.diff(candidate)
+    first = time.time() - start
+
+    candidate.set('flags9', 'feature_4500', -1)
+    start = time.time()
+    diff = running.diff(candidate)
+    again = time.time() - start
+
+    print("options:      %d in %d sections" % (options, sections))
+    print("changed:      %d" % len(diff.changed))
+    print("first diff:   %.4fs" % first)
+    print("repeat diff:  %.4fs" % again)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
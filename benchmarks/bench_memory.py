@@ -0,0 +1,64 @@
+"""Memory benchmark for the :py:class:`funconf.Config` storage layout.
+
+Builds a configuration of many options spread over a number of sections and
+reports the memory held by the :py:class:`funconf.Config` object.  The legacy
+layout kept an additional ``section_option -> (section, option)`` lookup for
+every option; its cost is measured by rebuilding that lookup alongside the
+configuration.
+
+Usage::
+
+    python benchmarks/bench_memory.py [options] [sections]
+"""
+from __future__ import print_function
+import gc
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, '.')
+import funconf
+
+
+def build(options, sections):
+    config = funconf.Config()
+    per_section = max(1, options // sections)
+    for i in range(options):
+        section = "flags%d" % (i // per_section)
+        config.set(section, "feature_%d" % i, i % 2 == 0)
+    return config
+
+
+def legacy_lookup(config):
+    lookup = {}
+    for section_name, section in config._sections.items():
+        for option in section:
+            lookup["%s_%s" % (section_name, option)] = (section_name, option)
+    return lookup
+
+
+def measure(func, *args):
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    result = func(*args)
+    elapsed = time.time() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main(options=200000, sections=100):
+    config, size, elapsed = measure(build, options, sections)
+    _, lookup_size, _ = measure(legacy_lookup, config)
+    print("options:            %d in %d sections" % (options, sections))
+    print("build time:         %.3fs" % elapsed)
+    print("config memory:      %.1f MiB (%.0f bytes/option)" % (
+          size / 2.0 ** 20, size / float(options)))
+    print("legacy lookup cost: %.1f MiB (%.0f bytes/option)" % (
+          lookup_size / 2.0 ** 20, lookup_size / float(options)))
+    print("legacy layout:      %.1f MiB" % ((size + lookup_size) / 2.0 ** 20))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,80 @@
+"""Read benchmark for :py:meth:`funconf.Config.read`.
+
+Writes JSON and YAML configurations of about 1, 10 and 100 MB and times
+reading them with and without memory mapping.  JSON files are read in full;
+the JSON parser can not read a mapped buffer, so they are never mapped and
+both columns should match.  YAML files are read lazily and a single section
+is used, which times the section scan; parsing all of a 100 MB YAML file
+takes minutes.
+
+Usage::
+
+    python benchmarks/bench_read.py [megabytes ...]
+"""
+from __future__ import print_function
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, '.')
+import funconf
+
+
+def generate(path, megabytes, format):
+    "Write a configuration of roughly megabytes MB to path."
+    size = megabytes * 1024 * 1024
+    written = 0
+    with open(path, 'w') as f:
+        if format == 'json':
+            f.write('{')
+        i = 0
+        while written < size:
+            options = dict(("feature_%d" % j, "value %d" % (i * 100 + j))
+                           for j in range(100))
+            if format == 'json':
+                chunk = '%s"flags%d": %s' % (',' if i else '', i,
+                                             json.dumps(options))
+            else:
+                chunk = "flags%d:\n%s" % (i, ''.join(
+                    "  %s: %s\n" % item for item in options.items()))
+            f.write(chunk)
+            written += len(chunk)
+            i += 1
+        if format == 'json':
+            f.write('}')
+    return i
+
+
+def timed(path, threshold, lazy):
+    funconf._MMAP_THRESHOLD = threshold
+    start = time.time()
+    config = funconf.Config(path, lazy=lazy)
+    config.flags0.feature_0
+    return time.time() - start
+
+
+def main(*sizes):
+    sizes = sizes or (1, 10, 100)
+    tmp = tempfile.mkdtemp()
+    threshold = funconf._MMAP_THRESHOLD
+    try:
+        print("%8s %6s %10s %10s" % ('size', 'format', 'read', 'mmap'))
+        for megabytes in sizes:
+            for format, lazy in (('json', False), ('yaml', True)):
+                path = os.path.join(tmp, 'bench.%s' % format)
+                generate(path, megabytes, format)
+                read = timed(path, float('inf'), lazy)
+                mapped = timed(path, 0, lazy)
+                print("%6dMB %6s %9.3fs %9.3fs" % (megabytes, format, read,
+                                                   mapped))
+                os.remove(path)
+    finally:
+        funconf._MMAP_THRESHOLD = threshold
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
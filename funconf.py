@@ -15,7 +15,10 @@ made up of *option:value* entries, or two levels of mappings that take on the
 form *section:option:value*.
 
 The file format YAML has been chosen to allow for option values to exist as
-different types instead of being restricted to string type values.
+different types instead of being restricted to string type values.  Files
+ending in ``.json`` or ``.toml`` are read as JSON or TOML into the same
+*section:option:value* model, and other formats can be added with
+:py:func:`register_format`.
 
 
 The configuration file
@@ -107,16 +110,43 @@ used as a decorator to a function too. Here is an example::
     def myfunc(**kwargs):
         print(kwargs)
 
+A mapping found as an option value in the configuration file is loaded as a
+nested section.  Nested sections are reached through attributes or their
+dotted path, and can decorate a function in the same way::
+
+    assert config.db.replica.pool.size == 4
+    assert config['db.replica.pool.size'] == 4
+    assert config['db_replica_pool_size'] == 4
+
 """
+import array
+import datetime
+import decimal
+import errno
 import functools
+import hashlib
+import io
+import json
+import keyword
+import mmap
+import os
+import re
+import shlex
+import sqlite3
+import stat
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import MutableMapping, Mapping, namedtuple
+from contextlib import contextmanager
+from distutils.util import strtobool
+from fnmatch import translate
 from inspect import isfunction, ismethod 
-from collections import MutableMapping
 try:
     from collections import OrderedDict 
 except ImportError:
     from ordereddict import OrderedDict
-import shlex
-from distutils.util import strtobool
 try:
     from inspect import signature, Signature, Parameter
 except ImportError:
@@ -125,9 +155,507 @@ try:
     basestring = basestring
 except NameError:
     basestring = (str, bytes) 
+try:
+    intern = intern
+except NameError:
+    from sys import intern
+try:
+    long = long
+except NameError:
+    long = int
+_integer = (int, long) if long is not int else (int,)
+try:
+    from pathlib import PurePath
+except ImportError:
+    PurePath = None
+try:
+    from enum import Enum
+except ImportError:
+    Enum = None
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
 import yaml
 
 
+_wildcard = re.compile(r'[*?[]')
+
+
+def _match_sorted(names, mapping, pattern):
+    """Return the names in the sorted list *names* that match the shell style
+    *pattern*.  Only the names sharing the literal prefix of *pattern* are
+    visited, and a pattern without a wildcard is a single lookup in
+    *mapping*."""
+    found = _wildcard.search(pattern)
+    if found is None:
+        return [pattern] if pattern in mapping else []
+    prefix = pattern[:found.start()]
+    if pattern[found.start():] == '*':
+        match = None
+    else:
+        match = re.compile(translate(pattern)).match
+    matches = []
+    for index in range(bisect_left(names, prefix), len(names)):
+        name = names[index]
+        if not name.startswith(prefix):
+            break
+        if match is None or match(name):
+            matches.append(name)
+    return matches
+
+
+_casters = {}
+_compiled = {}
+_array_types = (array.array,) if numpy is None else (array.array,
+                                                     numpy.ndarray)
+try:
+    array.array('q')
+    _INT_TYPECODE = 'q'
+except ValueError:
+    _INT_TYPECODE = 'l'
+
+
+def register_caster(vtype, factory):
+    """Register the caster *factory* for values of the type *vtype* and its
+    subclasses.  The registry is shared by every :py:func:`lazy_string_cast`
+    decorator and :py:class:`Schema` object.
+
+    The *factory* is called with a default value and returns a caster that is
+    called with *(key, string)* and returns the cast value.  A caster is
+    compiled once for each type and shared.  The following example casts
+    strings for complex default values::
+
+        def complex_caster(default):
+            return lambda key, value: complex(value)
+
+        register_caster(complex, complex_caster)
+
+    :param vtype: the type of the default values to cast for.
+    :type vtype: type
+    :param factory: returns the caster for a default value.
+    :type factory: callable
+    """
+    _casters[vtype] = factory
+    _compiled.clear()
+
+
+def _caster_key(default):
+    """Return the key the caster for *default* is shared under.  The key of
+    a list holds the key of its first item, so nested lists of different
+    types get different casters."""
+    vtype = type(default)
+    if vtype is list and default:
+        return (vtype, _caster_key(default[0]))
+    elif vtype is array.array:
+        return (vtype, default.typecode)
+    elif numpy is not None and vtype is numpy.ndarray:
+        return (vtype, default.dtype.str)
+    return vtype
+
+
+def caster_for(default):
+    """Return the shared caster for strings that should be converted to the
+    type of *default*, or None if no caster is registered for that type.
+
+    :param default: the default value to model the type from.
+    :rtype: callable taking *(key, string)* or None.
+    """
+    vtype = type(default)
+    lookup = _caster_key(default)
+    try:
+        return _compiled[lookup]
+    except KeyError:
+        pass
+    caster = None
+    for base in getattr(vtype, '__mro__', (vtype,)):
+        if base in _casters:
+            caster = _casters[base](default)
+            break
+    _compiled[lookup] = caster
+    return caster
+
+
+def _raising_caster(convert, vtype):
+    "Return a caster that raises a ValueError when *convert* fails."
+    def cast(key, value):
+        try:
+            return convert(value)
+        except Exception:
+            msg = "Can not convert %s='%s' to %s" % (key, value, vtype)
+            raise ValueError(msg)
+    return cast
+
+
+def _list_caster(default):
+    inner = caster_for(default[0]) if default else None
+    def cast(key, value):
+        value = shlex.split(value.replace("\\", "_windowsCompat_"))
+        value = [a.replace("_windowsCompat_", "\\") for a in value]
+        if inner is not None:
+            value = [inner(key, a) for a in value]
+        return value
+    return cast
+
+
+def _array_caster(default):
+    # Numbers are split in bulk and converted by the array constructor,
+    # rather than through shlex and a caster for each item.
+    vtype, typecode = type(default), default.typecode
+    convert = float if typecode in 'fd' else int
+    def parse(value):
+        return vtype(typecode, map(convert, value.replace(',', ' ').split()))
+    return _raising_caster(parse, vtype)
+
+
+def _ndarray_caster(default):
+    dtype = default.dtype
+    def parse(value):
+        return numpy.array(value.replace(',', ' ').split(), dtype=dtype)
+    return _raising_caster(parse, numpy.ndarray)
+
+
+def _strtobool(value):
+    return bool(strtobool(value))
+
+
+def _datetime_caster(default):
+    vtype = type(default)
+    if hasattr(vtype, 'fromisoformat'):
+        return _raising_caster(vtype.fromisoformat, vtype)
+    if issubclass(vtype, datetime.datetime):
+        formats = ['%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S',
+                   '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
+        def convert(value):
+            for fmt in formats:
+                try:
+                    return vtype.strptime(value, fmt)
+                except ValueError:
+                    pass
+            raise ValueError(value)
+    elif issubclass(vtype, datetime.date):
+        def convert(value):
+            d = datetime.datetime.strptime(value, '%Y-%m-%d')
+            return vtype(d.year, d.month, d.day)
+    else:
+        def convert(value):
+            fmt = '%H:%M:%S.%f' if '.' in value else '%H:%M:%S'
+            t = datetime.datetime.strptime(value, fmt)
+            return vtype(t.hour, t.minute, t.second, t.microsecond)
+    return _raising_caster(convert, vtype)
+
+
+def _enum_caster(default):
+    vtype = type(default)
+    by_value = dict((str(member.value), member) for member in vtype)
+    def convert(value):
+        member = vtype.__members__.get(value)
+        if member is None:
+            member = by_value[value]
+        return member
+    return _raising_caster(convert, vtype)
+
+
+def _convert_caster(default):
+    return _raising_caster(type(default), type(default))
+
+
+register_caster(list, _list_caster)
+register_caster(array.array, _array_caster)
+if numpy is not None:
+    register_caster(numpy.ndarray, _ndarray_caster)
+register_caster(bool, lambda default: _raising_caster(_strtobool, bool))
+register_caster(int, _convert_caster)
+register_caster(float, _convert_caster)
+if long is not int:
+    register_caster(long, _convert_caster)
+register_caster(decimal.Decimal, _convert_caster)
+register_caster(datetime.datetime, _datetime_caster)
+register_caster(datetime.date, _datetime_caster)
+register_caster(datetime.time, _datetime_caster)
+if PurePath is not None:
+    register_caster(PurePath, lambda default: (lambda key, value:
+                                               type(default)(value)))
+if Enum is not None:
+    register_caster(Enum, _enum_caster)
+
+
+class _StrCast(dict):
+    "Map parameter names to the casters for their string values."
+
+    def __call__(self, name, value):
+        if isinstance(value, basestring) and name in self:
+            return self[name](name, value)
+        else:
+            return value
+
+    def add(self, name, default, frozen=False):
+        if frozen and type(default) is tuple:
+            # A Config object that keeps immutable values holds lists as
+            # tuples.
+            default = list(default)
+        if not isinstance(default, basestring):
+            caster = caster_for(default)
+            if caster is not None:
+                self[name] = _frozen_cast(caster) if frozen else caster
+
+
+def _frozen_cast(caster):
+    "Return a caster that freezes the values cast by caster."
+    return lambda key, value: _freeze_value(caster(key, value))
+
+
+# A lazy_string_cast wrapper passes arguments straight through once this many
+# calls in a row have passed no strings, and stops doing so after
+# _MAX_DEOPTS strings have been passed to the fast path.
+_SPECIALISE_AFTER = 8
+_MAX_DEOPTS = 16
+
+
+class CallProfile(object):
+    """The argument profile of a :py:func:`lazy_string_cast` wrapper, read
+    from its *profile* attribute.
+
+    *fast* is True while calls are passed straight to the wrapped function.
+    *fast_calls* and *cast_calls* count the calls made on each path, and
+    *deopts* counts the times a string argument turned the fast path off.
+    """
+
+    __slots__ = ('fast', 'streak', 'fast_calls', 'cast_calls', 'deopts')
+
+    def __init__(self):
+        self.fast = False
+        self.streak = 0
+        self.fast_calls = 0
+        self.cast_calls = 0
+        self.deopts = 0
+
+    def typed(self):
+        "Record a call that passed no values to cast."
+        self.streak += 1
+        if self.streak >= _SPECIALISE_AFTER and self.deopts < _MAX_DEOPTS:
+            self.fast = True
+
+    def untyped(self):
+        "Record a call that passed values to cast."
+        self.streak = 0
+        if self.fast:
+            self.fast = False
+            self.deopts += 1
+
+    def __repr__(self):
+        return ("CallProfile(fast=%r, fast_calls=%d, cast_calls=%d, "
+                "deopts=%d)" % (self.fast, self.fast_calls, self.cast_calls,
+                                self.deopts))
+
+
+def _typed(args, kwargs, needed, strings):
+    """Return True if calling the wrapped function with args and kwargs gives
+    the same result as casting them: no string needs a cast and every
+    argument in needed, a list of *(index, name)*, is passed.
+    """
+    if strings:
+        for value in args:
+            if isinstance(value, basestring):
+                return False
+        for value in kwargs.values():
+            if isinstance(value, basestring):
+                return False
+    for index, name in needed:
+        if index >= len(args) and name not in kwargs:
+            return False
+    return True
+
+
+def _split_self(sig, model):
+    """Return *(first, sig)* where first is the leading ``self`` parameter of
+    sig, or None if sig has none, and sig is the signature without it.  The
+    wrapper of a method passes ``self`` through without binding or casting
+    it, unless model has an option of that name."""
+    params = list(sig.parameters.values())
+    if (params and params[0].name == 'self' and
+            params[0].kind == Parameter.POSITIONAL_OR_KEYWORD and
+            params[0].default is Parameter.empty and 'self' not in model):
+        return params[0], sig.replace(parameters=params[1:])
+    return None, sig
+
+
+def _join_self(first, sig):
+    "Return sig with the parameter first, if any, put back in front."
+    if first is None:
+        return sig
+    return sig.replace(parameters=[first] + list(sig.parameters.values()))
+
+
+def _decorated(func, wrapper, sig):
+    """Return wrapper, built for a function decorated by
+    :py:func:`wraps_parameters` or :py:func:`lazy_string_cast`, with the
+    name, docstring and attributes of func and the signature sig."""
+    own = dict(wrapper.__dict__)
+    functools.update_wrapper(wrapper, func)
+    wrapper.__dict__.update(own)
+    wrapper.__signature__ = sig
+    return wrapper
+
+
+def _list_types(model):
+    """Return the types a list value is held as in model.  A
+    :py:class:`Config` object that keeps immutable values, or one of its
+    sections, holds lists as tuples, and one that keeps arrays holds numeric
+    lists as arrays."""
+    if isinstance(model, ConfigSection):
+        model = model._config
+    types = (list,)
+    if isinstance(model, Config):
+        if model._immutable:
+            types += (tuple,)
+        if model._arrays:
+            types += _array_types
+    return types
+
+
+def _items(mapping):
+    """Return the items of mapping.  The options of a :py:class:`Config` or
+    :py:class:`ConfigSection` are read without counting them as reads for
+    :py:meth:`Config.track_access`."""
+    if isinstance(mapping, (Config, ConfigSection)):
+        return mapping._items()
+    return mapping.items()
+
+
+def _peek(mapping, key):
+    """Return mapping[key].  An option of a :py:class:`Config` or
+    :py:class:`ConfigSection` is read without counting it as a read."""
+    if isinstance(mapping, Config):
+        found = mapping._resolve(key)
+        if found is None:
+            raise KeyError(key)
+        return found[0]._read(found[1])
+    if isinstance(mapping, ConfigSection):
+        return mapping._read(key)
+    return mapping[key]
+
+
+def _is_function(obj):
+    "Return True if obj is a function or method."
+    return isfunction(obj) or ismethod(obj)
+
+
+def _wraps_build(func, sig, default_kwargs, defaults, hide_var_keyword,
+                 hide_var_positional):
+    """Return *(wrapper, signature)* for func decorated by
+    :py:func:`wraps_parameters`.  sig is the signature of func and defaults
+    an ordered copy of the items of default_kwargs; :py:class:`Config`
+    decorators read both once and share them between the stacked layers.
+    """
+    # Build new signature.
+    var_keyword = '' 
+    var_positional = '' 
+    parameters = OrderedDict()
+    original_positional = OrderedDict()
+    first, original_sig = _split_self(sig, defaults)
+    skip = 0 if first is None else 1
+    # Add positional arguments and keywords first.
+    for name, param in original_sig.parameters.items():
+        if param.kind == param.VAR_KEYWORD:
+            var_keyword = name
+        elif param.kind == param.VAR_POSITIONAL:
+            var_positional = name
+        else:
+            if name in defaults:
+                param = param.replace(default=defaults[name])
+            parameters[name] = param
+            original_positional[name] = param
+    # Add var positional.
+    if var_positional:
+        parameters[var_positional] = Parameter(var_positional, 
+                                               Parameter.VAR_POSITIONAL)
+    # Add remainder defualt_kwargs as keyword only variables.
+    for name, value in defaults.items():
+        if name not in parameters:
+            param = Parameter(name, Parameter.KEYWORD_ONLY, default=value)
+            parameters[name] = param
+    # Add var keyword.
+    if var_keyword:
+        parameters[var_keyword] = Parameter(var_keyword,
+                                            Parameter.VAR_KEYWORD)
+    # Build our inner wrapper signature.
+    wrapper_sig = original_sig.replace(parameters=parameters.values())
+    # Remove cloaked var arguments.
+    if var_positional and hide_var_positional:
+        parameters.pop(var_positional)
+    if var_keyword and hide_var_keyword:
+        parameters.pop(var_keyword)
+    cloak_sig = original_sig.replace(parameters=parameters.values())
+
+    # Wrapper function.
+    function_defaults = set(original_sig.parameters)
+    override_defaults = set(defaults).intersection(function_defaults)
+    def wrapper(*args, **kwargs):
+        # Build new kwargs and args.  A method's self is passed through.
+        head, args = args[:skip], args[skip:]
+        arguments = OrderedDict(wrapper_sig.bind(*args, **kwargs).arguments)
+        kwargs = {}
+        updates = {}
+
+        # Build the positional arguments. Override func's default values.
+        ordered_args = OrderedDict()
+        for name in original_positional:
+            if name in arguments:
+                ordered_args[name] = arguments[name]
+                if name in default_kwargs:
+                    updates[name] = arguments[name]
+            elif name in default_kwargs:
+                ordered_args[name] = default_kwargs[name]
+                updates[name] = default_kwargs[name]
+
+        # Now handle the keyword only and var arguments
+        args = list(head)
+        args.extend(ordered_args.values())
+        for name in set(arguments).difference(ordered_args):
+            value = arguments[name]
+            if name == var_positional:
+                args.extend(value)
+            elif name == var_keyword: 
+                for k, v in value.items():
+                    kwargs[k] = v
+            else:
+                # Update keyword only values
+                if name in default_kwargs:
+                    updates[name] = value
+                kwargs[name] = value
+
+        default_kwargs.update(updates)
+        if var_keyword:
+            # Add default_kwargs keyword values not defined in kwargs.
+            for k in set(default_kwargs).difference(kwargs):
+                if k not in original_positional:
+                    kwargs[k] = default_kwargs[k]
+        else:
+            # Remove kwargs that func doesn't have defined.
+            for k in set(kwargs).difference(function_defaults):
+                kwargs.pop(k)
+        return func(*args, **kwargs)
+
+    # Return the wrapper with the cloaked signature. 
+    return wrapper, _join_self(first, cloak_sig)
+
+
 def wraps_parameters(default_kwargs, hide_var_keyword=False,
                                      hide_var_positional=False):
     """Decorate a function to define and extend its positional and keyword
@@ -161,100 +689,106 @@ def wraps_parameters(default_kwargs, hide_var_keyword=False,
     :rtype: decorated function.
     """
     def decorator(func):
-        # Build new signature.
-        original_sig = signature(func)
-        var_keyword = '' 
-        var_positional = '' 
-        parameters = OrderedDict()
-        original_positional = OrderedDict()
-        # Add positional arguments and keywords first.
-        for name, param in original_sig.parameters.items():
-            if param.kind == param.VAR_KEYWORD:
-                var_keyword = name
-            elif param.kind == param.VAR_POSITIONAL:
-                var_positional = name
+        defaults = OrderedDict(_items(default_kwargs))
+        wrapper, sig = _wraps_build(func, signature(func), default_kwargs,
+                                    defaults, hide_var_keyword,
+                                    hide_var_positional)
+        return _decorated(func, wrapper, sig)
+    return decorator
+
+
+def _cast_build(func, sig, model_parameters, defaults, provide_defaults,
+                schema):
+    """Return *(wrapper, signature)* for func decorated by
+    :py:func:`lazy_string_cast`.  sig is the signature of func and defaults
+    an ordered copy of the items of model_parameters.
+    """
+    first, sig = _split_self(sig, defaults)
+    skip = 0 if first is None else 1
+    var_keyword, var_positional = '', '' 
+    positional = []
+    parameters = []
+    replaced = False
+    original_defaults = {}
+    # Build the StrCast object
+    str_cast = _StrCast() 
+    for name, param in sig.parameters.items():
+        if param.default != param.empty:
+            str_cast.add(name, param.default)
+            original_defaults[name] = param.default
+        elif name in defaults:
+            param = param.replace(default=defaults[name])
+            replaced = True
+        parameters.append(param)
+        if param.kind == param.VAR_KEYWORD:
+            var_keyword = name
+        elif param.kind == param.VAR_POSITIONAL:
+            var_positional = name
+        elif param.kind == param.POSITIONAL_OR_KEYWORD:
+            positional.append(name)
+    frozen = tuple in _list_types(model_parameters)
+    for name, value in defaults.items():
+        if schema is not None and name in schema:
+            field = schema.caster(name)
+            caster = field if field.cast is None else field.cast_string
+            str_cast[name] = _frozen_cast(caster) if frozen else caster
+        else:
+            str_cast.add(name, value, frozen)
+
+    if provide_defaults and replaced:
+        sig = sig.replace(parameters=parameters)
+    # Positional arguments that default to a model value when they are
+    # not passed can not be left to the wrapped function's defaults.
+    needed = [(index, name) for index, name in enumerate(positional, skip)
+              if provide_defaults and name in defaults]
+    strings = bool(str_cast)
+    profile = CallProfile()
+
+    def wrapper(*args, **kwargs):
+        if profile.fast:
+            if _typed(args, kwargs, needed, strings):
+                profile.fast_calls += 1
+                return func(*args, **kwargs)
+            profile.untyped()
+        elif _typed(args, kwargs, needed, strings):
+            profile.typed()
+        else:
+            profile.untyped()
+        profile.cast_calls += 1
+        return cast_call(*args, **kwargs)
+
+    def cast_call(*args, **kwargs):
+        head, args = args[:skip], args[skip:]
+        arguments = OrderedDict(sig.bind(*args, **kwargs).arguments)
+        # Cast the function's positional arguments.
+        ordered_args = OrderedDict()
+        for name in positional:
+            if name in arguments:
+                ordered_args[name] = str_cast(name, arguments[name])
+            elif provide_defaults and name in model_parameters:
+                ordered_args[name] = model_parameters[name]
             else:
-                default = default_kwargs.get(name, param.default)
-                param = Parameter(name, param.kind, default=default)
-                parameters[name] = param
-                original_positional[name] = param
-        # Add var positional.
-        if var_positional:
-            parameters[var_positional] = Parameter(var_positional, 
-                                                   Parameter.VAR_POSITIONAL)
-        # Add remainder defualt_kwargs as keyword only variables.
-        for name, value in default_kwargs.items():
-            if name not in parameters:
-                param = Parameter(name, Parameter.KEYWORD_ONLY, default=value)
-                parameters[name] = param
-        # Add var keyword.
-        if var_keyword:
-            parameters[var_keyword] = Parameter(var_keyword,
-                                                Parameter.VAR_KEYWORD)
-        # Build our inner wrapper signature.
-        wrapper_sig = original_sig.replace(parameters=parameters.values())
-        # Remove cloaked var arguments.
-        if var_positional and hide_var_positional:
-            parameters.pop(var_positional)
-        if var_keyword and hide_var_keyword:
-            parameters.pop(var_keyword)
-        cloak_sig = original_sig.replace(parameters=parameters.values())
-
-        # Wrapper function.
-        function_defaults = set(original_sig.parameters)
-        override_defaults = set(default_kwargs).intersection(function_defaults)
-        def wrapper(*args, **kwargs):
-            # Build new kwargs and args.
-            arguments = OrderedDict(wrapper_sig.bind(*args, **kwargs).arguments)
-            kwargs = {}
-            updates = {}
-            
-            # Build the positional arguments. Override func's default values.
-            ordered_args = OrderedDict()
-            for name in original_positional:
-                if name in arguments:
-                    ordered_args[name] = arguments[name]
-                    if name in default_kwargs:
-                        updates[name] = arguments[name]
-                elif name in default_kwargs:
-                    ordered_args[name] = default_kwargs[name]
-                    updates[name] = default_kwargs[name]
-            
-            # Now handle the keyword only and var arguments
-            args = list(ordered_args.values())
-            for name in set(arguments).difference(ordered_args):
-                value = arguments[name]
-                if name == var_positional:
-                    args.extend(value)
-                elif name == var_keyword: 
-                    for k, v in value.items():
-                        kwargs[k] = v
-                else:
-                    # Update keyword only values
-                    if name in default_kwargs:
-                        updates[name] = value
-                    kwargs[name] = value
-
-            default_kwargs.update(updates)
-            if var_keyword:
-                # Add default_kwargs keyword values not defined in kwargs.
-                for k in set(default_kwargs).difference(kwargs):
-                    if k not in original_positional:
-                        kwargs[k] = default_kwargs[k]
+                ordered_args[name] = original_defaults[name]
+        args = list(head)
+        args.extend(ordered_args.values())
+        # Cast the function's keyword arguments.
+        kwargs = {}
+        for name in set(arguments).difference(ordered_args):
+            value = arguments[name]
+            if name == var_positional:
+                args.extend(value)
+            elif name == var_keyword: 
+                for k, v in value.items():
+                    kwargs[k] = str_cast(k, v)
             else:
-                # Remove kwargs that func doesn't have defined.
-                for k in set(kwargs).difference(function_defaults):
-                    kwargs.pop(k)
-            return func(*args, **kwargs)
-
-        # Return wrapped up func with the cloaked signature. 
-        functools.update_wrapper(wrapper, func)
-        wrapper.__signature__ = cloak_sig
-        return wrapper
-    return decorator
+                kwargs[name] = str_cast(name, value)
+        return func(*args, **kwargs)
+    wrapper.profile = profile
+    return wrapper, _join_self(first, sig)
 
 
-def lazy_string_cast(model_parameters={}, provide_defaults=True):
+def lazy_string_cast(model_parameters={}, provide_defaults=True,
+                     schema=None):
     """Type cast string input values if they differ from the type of the
     default value found in *model_parameters*.
     
@@ -270,9 +804,23 @@ def lazy_string_cast(model_parameters={}, provide_defaults=True):
             the default list value in model contains items, the first item is
             sampled an attempt to cast the entire list is made for that type.
             
+        Decimal, datetime, date, time, Path, Enum:
+            The input value string is converted to the type of the default.
+            datetime values are read in ISO 8601 form and Enum members are
+            matched by name, then by value.
+
         other:
-            An attempt to convert other types will be made.  If this fails, the
-            input value will be passed through in its original string form.
+            The input value will be passed through in its original string
+            form, unless a caster has been added for the type using
+            :py:func:`register_caster`.
+
+    Calls that pass no strings have nothing to cast.  Once a number of calls
+    in a row have passed no strings, the arguments are passed straight to
+    the decorated function without being bound to its signature.  A call
+    that passes a string is cast as usual and turns the fast path off until
+    another run of calls without strings is seen.  The decorated function's
+    *profile* attribute is a :py:class:`CallProfile` that counts these
+    changes.
     
     This example demonstrates how :py:func:`lazy_string_cast` can be applied::
         
@@ -296,123 +844,1237 @@ def lazy_string_cast(model_parameters={}, provide_defaults=True):
     :param provide_defaults: If true, use model_parameters to default arguments
                              which are empty.
     :type provide_defaults: Boolean value default True.
+    :param schema: If set, the compiled casters of the schema are used for
+                   the keys it defines instead of building new ones.  Only
+                   strings are cast, so the values in model_parameters,
+                   which the schema checks when they are read, are not
+                   checked again; a cast string is checked against the
+                   constraint of its key.
+    :type schema: :py:class:`Schema`
     :rtype: decorated function.
     """
-    def cast_type_raise(vtype, key, value):
-        try:
-            value = vtype(value)
-        except:
-            msg = "Can not convert %s='%s' to %s" % (key, value,
-                    vtype)
-            raise ValueError(msg)
-        return value
+    def decorator(func):
+        defaults = OrderedDict(_items(model_parameters))
+        wrapper, sig = _cast_build(func, signature(func), model_parameters,
+                                   defaults, provide_defaults, schema)
+        return _decorated(func, wrapper, sig)
 
-    def cast_type(vtype, key, value):
-        try:
-            value = vtype(value)
-        except:
-            pass
-        return value
+    if _is_function(model_parameters):
+        func, model_parameters= model_parameters, {}
+        return decorator(func)
+    else:
+        return decorator
 
-    def cast_list(inner_cast_func, key, value):
-        value = shlex.split(value.replace("\\", "_windowsCompat_"))
-        value = [a.replace("_windowsCompat_", "\\") for a in value]
-        if inner_cast_func is not None:
-            value = [inner_cast_func(a) for a in value]
+
+def _decorate(mapping, func, lazy, hide_var_positional, hide_var_keyword,
+              schema=None):
+    """Return func decorated by the :py:class:`Config` or
+    :py:class:`ConfigSection` mapping.  The signature of func and a copy of
+    the options of mapping are read once and shared by the stacked
+    :py:func:`lazy_string_cast` and :py:func:`wraps_parameters` layers.
+    """
+    sig = signature(func)
+    defaults = OrderedDict(_items(mapping))
+    if lazy:
+        wrapper, sig = _cast_build(func, sig, {}, {}, True, None)
+        func = _decorated(func, wrapper, sig)
+    wrapper, sig = _wraps_build(func, sig, mapping, defaults,
+                                hide_var_keyword, hide_var_positional)
+    func = _decorated(func, wrapper, sig)
+    if lazy:
+        wrapper, sig = _cast_build(func, sig, mapping, defaults, True, schema)
+        func = _decorated(func, wrapper, sig)
+    return func
+
+
+class SchemaError(ValueError):
+    """Raised by :py:meth:`Schema.validate` once every value has been checked.
+    The *errors* attribute holds the list of *(key, message)* tuples found.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        msg = "; ".join("%s: %s" % (key, message) for key, message in errors)
+        super(SchemaError, self).__init__(msg)
+
+
+def _conforms(vtype, value, sequences=(list,)):
+    """Return True if value is an acceptable value for the type vtype.  A list
+    value may be held as any of the sequences types."""
+    if vtype is type(None):
+        return True
+    if isinstance(value, bool):
+        return vtype is bool
+    if vtype is float:
+        return isinstance(value, _integer + (float,))
+    if vtype is int:
+        return isinstance(value, _integer)
+    if vtype is list:
+        return isinstance(value, sequences)
+    if issubclass(vtype, basestring):
+        return isinstance(value, basestring)
+    return isinstance(value, vtype)
+
+
+class _Field(object):
+    "A compiled type, element type, caster and constraint for a single key."
+
+    __slots__ = ('key', 'vtype', 'item_type', 'cast', 'constraint')
+
+    def __init__(self, key, default, constraint=None):
+        self.key = key
+        self.vtype = type(default)
+        self.item_type = None
+        if (self.vtype is list or self.vtype is tuple) and default:
+            self.item_type = type(default[0])
+        self.cast = None
+        if not isinstance(default, basestring):
+            self.cast = caster_for(default)
+        self.constraint = constraint
+
+    def __call__(self, key, value, sequences=(list,)):
+        """Return value cast and checked against this field.  A ValueError is
+        raised if the value does not conform.  A list value may be held as
+        any of the *sequences* types."""
+        if isinstance(value, basestring) and self.cast is not None:
+            value = self.cast(key, value)
+        if not _conforms(self.vtype, value, sequences):
+            raise ValueError("expected %s, got %r" % (self.vtype.__name__,
+                                                     value))
+        if self.item_type is not None and isinstance(value, (list, tuple)):
+            for item in value:
+                if not _conforms(self.item_type, item):
+                    raise ValueError("expected items of %s, got %r" % (
+                                     self.item_type.__name__, item))
+        return self.check(value)
+
+    def check(self, value):
+        "Return value, raising a ValueError if it fails the constraint."
+        constraint = self.constraint
+        if constraint is not None:
+            if callable(constraint):
+                ok = constraint(value)
+            else:
+                ok = value in constraint
+            if not ok:
+                raise ValueError("%r does not satisfy the constraint" % 
+                                 (value,))
         return value
 
-    def cast_factory(k, v):
-        def make_cast_func(func, key, cast_type):
-            return lambda value: func(cast_type, key, value)
-        vtype = type(v)
-        if vtype is list:
-            inner_cast_func = None if not v else cast_factory(k, v[0])
-            return make_cast_func(cast_list, k, inner_cast_func)
-        elif vtype is bool:
-            return make_cast_func(cast_type_raise, k, 
-                                  lambda x: bool(strtobool(x)))
-        elif vtype in [int, float]:
-            return make_cast_func(cast_type_raise, k, vtype)
+    def cast_string(self, key, value):
+        """Return the string value cast for a decorated function.  The
+        caster gives values of this field's types, so only the constraint
+        is checked."""
+        return self.check(self.cast(key, value))
+
+
+class Schema(object):
+    """The :py:class:`Schema` class is a set of types compiled once from the
+    default values of a model.  The model can be a :py:class:`Config`, any
+    other mapping or a function whose keyword defaults define the types.
+
+    For each key the type of the default value is recorded, along with the
+    type of the first element of a default list value.  A value conforms if
+    it is an instance of that type, where an int also satisfies a float.  A
+    default of None accepts any value.
+
+    The following example checks the values of a configuration after it has
+    been read::
+
+        schema = Schema(Config('defaults.conf'),
+                        constraints=dict(web_port=lambda p: 0 < p < 65536))
+        config = Config(['/etc/app.conf', 'app.conf'], schema=schema)
+    """
+
+    __slots__ = ('_fields',)
+
+    def __init__(self, model, constraints={}):
+        """Compile a new :py:class:`Schema` object.
+
+        :param model: the defaults to derive the types from.
+        :type model: mapping, function or method
+        :param constraints: a callable that returns True for valid values, or
+                            a container of the valid values, for each key.
+        :type constraints: mapping
+        """
+        if _is_function(model):
+            defaults = [(name, param.default) for name, param in
+                        signature(model).parameters.items()
+                        if param.default is not param.empty]
         else:
-            return make_cast_func(cast_type, k, vtype)
+            defaults = _items(model)
+        self._fields = OrderedDict()
+        for key, default in defaults:
+            self._fields[key] = _Field(key, default, constraints.get(key))
+        for key, constraint in constraints.items():
+            if key not in self._fields:
+                self._fields[key] = _Field(key, None, constraint)
 
-    class StrCast(dict):
-        def __call__(self, name, value):
-            if isinstance(value, basestring) and name in self:
-                return self[name](value)
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def caster(self, key):
+        """Return the compiled caster that casts and checks a value for
+        *key*.  It is called with *(key, value)* and raises ValueError for
+        values that do not conform."""
+        return self._fields[key]
+
+    def validate(self, mapping):
+        """Cast and check every value in *mapping* that has a key in this
+        schema, in a single pass.  String values are cast in the same manner
+        as :py:func:`lazy_string_cast` and written back into *mapping*.
+
+        :param mapping: the values to be validated.
+        :type mapping: mutable mapping
+        :raises SchemaError: listing every value that did not conform.
+        :rtype: the *mapping* object.
+        """
+        errors = []
+        sequences = _list_types(mapping)
+        for key, field in self._fields.items():
+            if key not in mapping:
+                continue
+            value = _peek(mapping, key)
+            try:
+                cast = field(key, value, sequences)
+            except ValueError as exc:
+                errors.append((key, str(exc)))
+                continue
+            if cast is not value:
+                mapping[key] = cast
+        if errors:
+            raise SchemaError(errors)
+        return mapping
+
+
+_ERROR_MODES = ('raise', 'skip', 'collect')
+
+
+class RecordCaster(object):
+    """The :py:class:`RecordCaster` class casts streams of string records,
+    such as rows read by :py:mod:`csv` or messages from a queue, into
+    typed kwargs.  It is made by :py:func:`record_caster`.
+
+    A caster is compiled once for each column from the shared registry used
+    by :py:func:`lazy_string_cast`, so casting a record only calls the
+    casters of the columns that need one.  Records that fail to cast are
+    handled according to *errors*:
+
+        * ``'raise'`` raises a ValueError naming the record.
+        * ``'skip'`` drops the record.
+        * ``'collect'`` drops the record and appends *(index, record,
+          message)* to :py:attr:`errors`.
+    """
+
+    __slots__ = ('columns', 'errors', '_defaults', '_casters', '_positions',
+                 '_mode')
+
+    def __init__(self, defaults, columns, errors, provide_defaults):
+        if errors not in _ERROR_MODES:
+            raise ValueError("errors must be one of %s" %
+                             ", ".join(_ERROR_MODES))
+        self.columns = columns
+        self.errors = []
+        self._mode = errors
+        self._defaults = defaults if provide_defaults else None
+        self._casters = []
+        for key, default in defaults.items():
+            if not isinstance(default, basestring):
+                caster = caster_for(default)
+                if caster is not None:
+                    self._casters.append((key, caster))
+        self._positions = []
+        for column in columns:
+            default = defaults.get(column, '')
+            if isinstance(default, basestring):
+                self._positions.append(None)
             else:
-                return value
+                self._positions.append(caster_for(default))
 
-    def decorator(func):
-        sig = signature(func)
-        var_keyword, var_positional = '', '' 
-        positional = []
-        parameters = []
-        original_defaults = {}
-        # Build the StrCast object
-        str_cast = StrCast() 
-        for name, param in sig.parameters.items():
-            if param.default != param.empty:
-                if not isinstance(param.default, basestring):
-                    str_cast[name] = cast_factory(name, param.default)
-                original_defaults[name] = param.default
-                default = param.default
-            elif param.default == param.empty and name in model_parameters:
-                default = model_parameters[name]
-            else: 
-                default = param.empty 
-            parameters.append(Parameter(name, param.kind, default=default))
-            if param.kind == param.VAR_KEYWORD:
-                var_keyword = name
-            elif param.kind == param.VAR_POSITIONAL:
-                var_positional = name
-            elif param.kind == param.POSITIONAL_OR_KEYWORD:
-                positional.append(name)
-        for name, value in model_parameters.items():
-            if not isinstance(value, basestring):
-                str_cast[name] = cast_factory(name, value)
-
-        if provide_defaults:
-            sig = sig.replace(parameters=parameters)
-
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            arguments = OrderedDict(sig.bind(*args, **kwargs).arguments)
-            # Cast the function's positional arguments.
-            ordered_args = OrderedDict()
-            for name in positional:
-                if name in arguments:
-                    ordered_args[name] = str_cast(name, arguments[name])
-                elif provide_defaults and name in model_parameters:
-                    ordered_args[name] = model_parameters[name]
-                else:
-                    ordered_args[name] = original_defaults[name]
-            args = list(ordered_args.values())
-            # Cast the function's keyword arguments.
+    def cast(self, record):
+        """Return the typed kwargs for a single *record*.  A mapping is cast
+        by key and any other sequence by position against :py:attr:`columns`.
+        Values that are not strings are passed through.
+
+        :param record: the string values to cast.
+        :type record: mapping or sequence
+        :raises ValueError: if a value can not be cast.
+        :rtype: dict
+        """
+        if isinstance(record, Mapping):
+            kwargs = dict(record)
+            for key, caster in self._casters:
+                if key in kwargs:
+                    value = kwargs[key]
+                    if isinstance(value, basestring):
+                        kwargs[key] = caster(key, value)
+        else:
+            columns = self.columns
+            if len(record) != len(columns):
+                raise ValueError("expected %s values, got %s" %
+                                 (len(columns), len(record)))
             kwargs = {}
-            for name in set(arguments).difference(ordered_args):
-                value = arguments[name]
-                if name == var_positional:
-                    args.extend(value)
-                elif name == var_keyword: 
-                    for k, v in value.items():
-                        kwargs[k] = str_cast(k, v)
-                else:
-                    kwargs[name] = str_cast(name, value)
-            return func(*args, **kwargs)
-        wrapper.__signature__ = sig
-        return wrapper
+            for key, caster, value in zip(columns, self._positions, record):
+                if caster is not None and isinstance(value, basestring):
+                    value = caster(key, value)
+                kwargs[key] = value
+        defaults = self._defaults
+        if defaults is not None:
+            for key, default in defaults.items():
+                if key not in kwargs:
+                    kwargs[key] = default
+        return kwargs
+
+    def cast_stream(self, records):
+        """Return an iterator that casts each record in *records* as it is
+        consumed.  In the ``'collect'`` mode :py:attr:`errors` is cleared
+        when iteration starts.
+
+        :param records: the records to cast.
+        :type records: iterable of mappings or sequences
+        :rtype: iterator of dict
+        """
+        if self._mode == 'collect':
+            del self.errors[:]
+        cast = self.cast
+        mode = self._mode
+        for index, record in enumerate(records):
+            try:
+                kwargs = cast(record)
+            except ValueError as exc:
+                if mode == 'raise':
+                    raise ValueError("record %s: %s" % (index, exc))
+                if mode == 'collect':
+                    self.errors.append((index, record, str(exc)))
+                continue
+            yield kwargs
 
-    if isfunction(model_parameters) or ismethod(model_parameters):
-        func, model_parameters= model_parameters, {}
-        return decorator(func)
+
+def record_caster(model, columns=None, errors='raise',
+                  provide_defaults=False):
+    """Return a :py:class:`RecordCaster` that casts string records to the
+    types of the default values of *model*, which can be a mapping, a
+    :py:class:`ConfigSection` or a function whose keyword defaults define
+    the types.  The casters are compiled once, so casting a stream costs
+    little more than the conversions themselves.  For example::
+
+        def load(host='', port=80, weights=[0.0]):
+            pass
+
+        caster = record_caster(load, errors='collect')
+        for kwargs in caster.cast_stream(csv.DictReader(f)):
+            load(**kwargs)
+
+    :param model: the defaults to derive the types from.
+    :type model: mapping, function or method
+    :param columns: the keys of the values in records that are sequences.
+                    By default the keys of *model* in order.
+    :type columns: list of str
+    :param errors: ``'raise'``, ``'skip'`` or ``'collect'``.
+    :type errors: str
+    :param provide_defaults: fill in the default of each key of *model* that
+                             a record does not have.
+    :type provide_defaults: bool
+    :rtype: :py:class:`RecordCaster`
+    """
+    if _is_function(model):
+        defaults = OrderedDict((name, param.default) for name, param in
+                               signature(model).parameters.items()
+                               if param.default is not param.empty)
     else:
-        return decorator
+        defaults = OrderedDict(_items(model))
+    if columns is None:
+        columns = list(defaults)
+    return RecordCaster(defaults, list(columns), errors, provide_defaults)
+
+
+_Format = namedtuple('_Format', 'name loads dumps binary buffer')
+_formats = {}
+_extensions = {}
+
+
+def register_format(name, loads, dumps=None, extensions=(), binary=False,
+                    buffer=False):
+    """Register a configuration file format for :py:meth:`Config.read`,
+    :py:meth:`Config.load` and :py:meth:`Config.dumps`.
+
+    *loads* is called with the content of a file and returns the
+    *section:option:value* mappings.  *dumps* is called with the same nested
+    mappings and returns the content.  Files are matched to a format by their
+    extension.  For example::
+
+        register_format('ini', load_ini, extensions=['.ini'])
+
+    :param name: the name of the format.
+    :type name: str
+    :param loads: parses a str, or bytes if *binary* is set.
+    :type loads: callable
+    :param dumps: serialises nested mappings, or None if the format can only
+                  be read.
+    :type dumps: callable
+    :param extensions: the file extensions of this format, e.g. ``'.json'``.
+    :type extensions: list of str
+    :param binary: if True files of this format are opened in binary mode.
+    :type binary: Boolean value default False.
+    :param buffer: if True *loads* parses any object that supports the buffer
+                   protocol, so large files of this format are memory mapped
+                   and parsed without being copied.
+    :type buffer: Boolean value default False.
+    """
+    _formats[name] = _Format(name, loads, dumps, binary, buffer)
+    for extension in extensions:
+        _extensions[extension.lower()] = name
+
+
+def _format_for(format, filename=None):
+    "Return the _Format named format, or the one matching filename."
+    if format is None:
+        extension = os.path.splitext(filename or '')[1].lower()
+        format = _extensions.get(extension, 'yaml')
+    try:
+        return _formats[format]
+    except KeyError:
+        raise ValueError("Unknown configuration format '%s'" % (format,))
+
+
+def _yaml_dumps(tree):
+    return yaml.dump(tree, default_flow_style=False)
+
+
+def _json_default(value):
+    raise ValueError("Can not represent %r in JSON" % (value,))
+
+
+def _json_dumps(tree):
+    return json.dumps(tree, indent=2, sort_keys=True, default=_json_default)
+
+
+_toml_bare_key = re.compile(r'^[A-Za-z0-9_-]+$')
+_toml_escapes = {0x08: '\\b', 0x09: '\\t', 0x0a: '\\n', 0x0c: '\\f',
+                 0x0d: '\\r', 0x22: '\\"', 0x5c: '\\\\'}
+
+
+def _toml_string(text):
+    """Return text as a TOML basic string of ASCII characters.  Characters
+    beyond the basic multilingual plane are written as ``\\UXXXXXXXX``, as
+    TOML has no surrogate pairs."""
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    try:
+        data = text.encode('utf-32-le')
+    except UnicodeError:
+        raise ValueError("Can not represent %r in TOML" % (text,))
+    parts = ['"']
+    for code in struct.unpack('<%dI' % (len(data) // 4), data):
+        escape = _toml_escapes.get(code)
+        if escape is not None:
+            parts.append(escape)
+        elif 0x20 <= code < 0x7f:
+            parts.append(chr(code))
+        elif code > 0xffff:
+            parts.append('\\U%08X' % code)
+        else:
+            parts.append('\\u%04X' % code)
+    parts.append('"')
+    return ''.join(parts)
+
+
+def _toml_key(key):
+    key = '%s' % (key,)
+    return key if _toml_bare_key.match(key) else _toml_string(key)
+
+
+def _toml_value(value, name):
+    "Return value as TOML.  name is the dotted key of value for errors."
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, _integer):
+        return str(value)
+    if isinstance(value, float):
+        if value != value:
+            return 'nan'
+        if value in (float('inf'), float('-inf')):
+            return '-inf' if value < 0 else 'inf'
+        return repr(value)
+    if isinstance(value, basestring):
+        return _toml_string(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ', '.join(_toml_value(v, name) for v in value)
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join(
+            '%s = %s' % (_toml_key(k), _toml_value(v, '%s.%s' % (name, k)))
+            for k, v in value.items())
+    if value is None:
+        raise ValueError("Can not represent None in TOML, which has no null "
+                         "value, for %s" % (name,))
+    raise ValueError("Can not represent %r in TOML for %s" % (value, name))
+
+
+def _toml_dumps(tree, path=()):
+    lines = []
+    tables = []
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            tables.append((key, value))
+        else:
+            name = '.'.join(path + ('%s' % (key,),))
+            lines.append('%s = %s' % (_toml_key(key),
+                                      _toml_value(value, name)))
+    for key, value in tables:
+        table = path + (_toml_key(key),)
+        if lines:
+            lines.append('')
+        lines.append('[%s]' % '.'.join(table))
+        lines.append(_toml_dumps(value, table))
+    return '\n'.join(lines)
+
+
+def _toml_loads(content):
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    return tomllib.loads(content)
+
+
+register_format('yaml', yaml.safe_load, _yaml_dumps,
+                extensions=['.yaml', '.yml', '.conf'])
+register_format('json', json.loads, _json_dumps, extensions=['.json'])
+if tomllib is not None:
+    register_format('toml', _toml_loads, _toml_dumps, extensions=['.toml'])
+else:
+    register_format('toml', None, _toml_dumps, extensions=['.toml'])
+if msgpack is not None:
+    register_format('msgpack', lambda content: msgpack.unpackb(content,
+                                                               raw=False),
+                    msgpack.packb, extensions=['.msgpack', '.mpk'],
+                    binary=True, buffer=True)
+
+
+# Files smaller than this are read into memory rather than mapped.
+_MMAP_THRESHOLD = 256 * 1024
+
+
+def _map_file(f):
+    """Return *(buffer, stat)* for the binary file object f.  Regular files
+    of at least _MMAP_THRESHOLD bytes are memory mapped.  The buffer is None
+    if the file is not a regular file or is too small to be worth mapping,
+    and the stat is None if f has no file descriptor.
+    """
+    try:
+        st = os.fstat(f.fileno())
+    except (AttributeError, io.UnsupportedOperation, OSError, ValueError):
+        return None, None
+    if not stat.S_ISREG(st.st_mode) or st.st_size < _MMAP_THRESHOLD:
+        return None, st
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), st
+    except (EnvironmentError, ValueError):
+        return None, st
+
+
+_yaml_top = re.compile(br'^[^\s#][^\n]*', re.M)
+_yaml_node_ref = re.compile(br'[&*][^\s,\]}]')
+_yaml_key = re.compile(br'^((?:"(?:[^"\\]|\\.)*"|\'(?:[^\']|\'\')*\'|[^\'"]'
+                       br'[^\n]*?)):(?:[ \t]|$)')
+
+
+def _scan_yaml(content):
+    """Return a list of *(section, start, end)* byte ranges for the top level
+    keys of a block style YAML document, or None if the document can not be
+    split into independent sections.
+    """
+    for marker in (b'---', b'...', b'%'):
+        # Directives and document markers.
+        if (content[:len(marker)] == marker or
+                content.find(b'\n' + marker) != -1):
+            return None
+    for match in _yaml_node_ref.finditer(content):
+        # Anchors and aliases tie sections together.
+        start = match.start()
+        if not start or content[start - 1:start] in b' \t\r\n-:[{,':
+            return None
+    sections = []
+    for match in _yaml_top.finditer(content):
+        line = match.group()
+        if line[:1] in b'-[{?!&*|>':
+            # Sequence items, flow collections, complex keys and the like.
+            return None
+        key = _yaml_key.match(line)
+        if key is None:
+            return None
+        text = key.group(1).strip()
+        if re.match(br'^[A-Za-z_][A-Za-z0-9_]*$', text) and text.lower() not in (
+                b'y', b'n', b'yes', b'no', b'on', b'off', b'true', b'false',
+                b'null'):
+            name = str(text.decode('ascii'))
+        else:
+            try:
+                parsed = yaml.safe_load(text + b': 0')
+            except yaml.YAMLError:
+                return None
+            if not isinstance(parsed, dict) or len(parsed) != 1:
+                return None
+            name = list(parsed)[0]
+            if not isinstance(name, (basestring, float) + _integer):
+                return None
+        if sections:
+            sections[-1][2] = match.start()
+        sections.append([name, match.start(), len(content)])
+    return sections
+
+
+_json_key = re.compile(br'\s*("(?:[^"\\]|\\.)*")\s*:\s*', re.S)
+_json_token = re.compile(br'["{}\[\],]')
+_json_string = re.compile(br'"(?:[^"\\]|\\.)*"', re.S)
+
+
+def _scan_json(content):
+    """Return a list of *(section, start, end)* byte ranges for the values of
+    the top level keys of a JSON object, or None if content is not an object.
+    """
+    match = re.match(br'\s*\{', content)
+    if match is None:
+        return None
+    pos = match.end()
+    sections = []
+    if re.match(br'\s*\}', content[pos:pos + 64]):
+        return sections
+    while True:
+        key = _json_key.match(content, pos)
+        if key is None:
+            return None
+        name = json.loads(key.group(1).decode('utf-8'))
+        start = pos = key.end()
+        depth = 0
+        while True:
+            token = _json_token.search(content, pos)
+            if token is None:
+                return None
+            char = token.group()
+            pos = token.end()
+            if char == b'"':
+                pos = _json_string.match(content, token.start()).end()
+            elif char in b'{[':
+                depth += 1
+            elif char in b'}]' and depth:
+                depth -= 1
+            elif depth == 0:
+                sections.append([name, start, token.start()])
+                if char == b'}':
+                    return sections
+                break
+
+
+_scanners = {
+    'yaml': (_scan_yaml, lambda chunk, name: yaml.safe_load(chunk)),
+    'json': (_scan_json, lambda chunk, name: {name: json.loads(chunk)}),
+}
+
+
+# Candidate files that did not exist are not probed again for this many
+# seconds.  At most _MISSING_MAX of them are remembered.
+_MISSING_TTL = 5.0
+_MISSING_MAX = 1024
+_missing = OrderedDict()
+_missing_lock = threading.Lock()
+_clock = getattr(time, 'monotonic', time.time)
+
+
+def _candidates(filenames):
+    """Return *(filename, path)* pairs for the candidate files, where path
+    has ``~`` and environment variables expanded and is normalised, in order.
+    A file given more than once is read at its last position, so that it
+    still overrides the files before it."""
+    seen = set()
+    pairs = []
+    for filename in reversed(list(filenames)):
+        path = os.path.normpath(os.path.expanduser(os.path.expandvars(
+            filename)))
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            pairs.append((filename, path))
+    pairs.reverse()
+    return pairs
+
+
+def _known_missing(path):
+    "Return True if path did not exist less than _MISSING_TTL seconds ago."
+    key = os.path.abspath(path)
+    with _missing_lock:
+        expires = _missing.get(key)
+        if expires is None:
+            return False
+        if expires > _clock():
+            return True
+        del _missing[key]
+        return False
+
+
+def _mark_missing(path):
+    """Remember that path does not exist, forgetting the oldest entry once
+    _MISSING_MAX are remembered."""
+    key = os.path.abspath(path)
+    with _missing_lock:
+        _missing.pop(key, None)
+        while len(_missing) >= _MISSING_MAX:
+            _missing.popitem(last=False)
+        _missing[key] = _clock() + _MISSING_TTL
+
+
+def clear_read_cache():
+    """Forget the configuration files that :py:meth:`Config.read` found
+    missing, so that the next read probes them again.  For example, after
+    creating a file that was read moments ago::
+
+        funconf.clear_read_cache()
+        config.read(['app.conf'])
+    """
+    with _missing_lock:
+        _missing.clear()
+
+
+def _parse_range(content, start, end, loads, name):
+    "Parse the byte range of the top level section name."
+    return loads(content[start:end], name)
+
+
+def _read_index(filename, st, format):
+    "Return the cached section ranges for a file if they are still valid."
+    try:
+        with open(filename, 'r') as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if (index.get('size') != st.st_size or
+            index.get('mtime') != st.st_mtime or
+            index.get('format') != format):
+        return None
+    return index.get('sections')
+
+
+def _write_index(filename, st, format, sections):
+    "Cache the section ranges of a file.  Failures are ignored."
+    index = dict(size=st.st_size, mtime=st.st_mtime, format=format,
+                 sections=sections)
+    try:
+        with open(filename, 'w') as f:
+            json.dump(index, f)
+    except (IOError, OSError, TypeError):
+        pass
 
 
 class ConfigAttributeError(AttributeError): pass
 
 
+class _Missing(object):
+    "The old value of an option that had not been set."
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+# The new value of a batched change to an option that depends on a changed
+# reference.  It is read when the batch is delivered.
+_RESOLVE = object()
+
+
+ConfigDiff = namedtuple('ConfigDiff', 'added removed changed')
+ConfigDiff.__doc__ = """The result of :py:meth:`Config.diff`.  Each field is
+a sorted list of *(section, option)* pairs."""
+
+
+def _merge_values(old, new, strategy):
+    """Return the merge of the new value into the old value.  Frozen and
+    array values are merged as the dicts and lists they hold."""
+    if isinstance(old, Mapping) and isinstance(new, Mapping):
+        merged = dict(old)
+        for key, value in new.items():
+            if key in merged:
+                value = _merge_values(merged[key], value, strategy)
+            merged[key] = value
+        return merged
+    sequences = (list, tuple) + _array_types
+    if isinstance(old, sequences) and isinstance(new, sequences):
+        old, new = _thaw_value(old), _thaw_value(new)
+        if strategy == 'append':
+            return old + new
+        merged = list(old)
+        for item in new:
+            if item not in merged:
+                merged.append(item)
+        return merged
+    return new
+
+
+class FrozenDict(Mapping):
+    """An immutable and hashable mapping.  :py:meth:`ConfigSection.freeze`
+    returns the mapping values of options as :py:class:`FrozenDict` objects.
+    """
+
+    __slots__ = ('_items', '_hash')
+
+    def __init__(self, *args, **kwargs):
+        self._items = dict(*args, **kwargs)
+        self._hash = None
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self._items.items()))
+        return self._hash
+
+    def __repr__(self):
+        return 'FrozenDict(%r)' % (self._items,)
+
+
+def _freeze_value(value):
+    "Return value with lists as tuples and dicts as FrozenDicts."
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_value(item) for item in value)
+    if isinstance(value, _array_types):
+        return tuple(value.tolist())
+    if isinstance(value, dict):
+        return FrozenDict((key, _freeze_value(item))
+                          for key, item in value.items())
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def _array_value(value, kind):
+    """Return a list of ints or of floats as an *array.array*, or as a
+    *numpy* array if kind is 'numpy'.  Other values, including lists that
+    mix ints and floats, are returned unchanged so that their items keep
+    their types.
+    """
+    if type(value) is not list or not value:
+        return value
+    kinds = set(map(type, value))
+    if kinds.issubset(_integer):
+        typecode = _INT_TYPECODE
+    elif kinds == set([float]):
+        typecode = 'd'
+    else:
+        return value
+    try:
+        if kind == 'numpy':
+            return numpy.array(value, dtype=float if typecode == 'd' else
+                               numpy.int64)
+        return array.array(typecode, value)
+    except OverflowError:
+        return value
+
+
+def _thaw_value(value):
+    """Return value with tuples and arrays as lists and mappings as dicts, so
+    that it can be serialised."""
+    if isinstance(value, (list, tuple)):
+        return [_thaw_value(item) for item in value]
+    if isinstance(value, _array_types):
+        return value.tolist()
+    if isinstance(value, Mapping):
+        return dict((key, _thaw_value(item)) for key, item in value.items())
+    return value
+
+
+class _Frozen(tuple):
+    """Base of the named tuple snapshots made by :py:meth:`Config.freeze`
+    and :py:meth:`ConfigSection.freeze`.  A snapshot only equals another
+    snapshot with the same field names, and hashes with them."""
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return (isinstance(other, _Frozen) and
+                self._fields == other._fields and tuple.__eq__(self, other))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self._fields, tuple(self)))
+
+
+# At most _FROZEN_MAX snapshot classes are cached.
+_FROZEN_MAX = 256
+_frozen_classes = OrderedDict()
+_frozen_lock = threading.Lock()
+_field = re.compile(r'[A-Za-z][A-Za-z0-9_]*$')
+
+
+def _frozen_fields(names, path):
+    """Return the named tuple field names for the option and section names
+    of path.  Characters that can not be in a field name become underscores
+    and keywords gain a trailing underscore.
+
+    :raises ValueError: if a name still does not start with a letter, or
+                        two names give the same field.
+    """
+    fields = []
+    seen = set()
+    for name in names:
+        field = re.sub(r'[^A-Za-z0-9_]', '_', '%s' % (name,))
+        if keyword.iskeyword(field):
+            field += '_'
+        if not _field.match(field) or field in seen:
+            raise ValueError("Can not freeze '%s' in %s as a field" %
+                             (name, path))
+        seen.add(field)
+        fields.append(field)
+    return tuple(fields)
+
+
+def _frozen_class(typename, names, path):
+    """Return the named tuple class for the names of path.  Classes are
+    cached, so freezing a configuration again after a reload only builds the
+    tuples."""
+    fields = _frozen_fields(names, path)
+    key = (typename, fields)
+    with _frozen_lock:
+        cls = _frozen_classes.get(key)
+        if cls is not None:
+            return cls
+    cls = type(typename, (namedtuple(typename, fields), _Frozen),
+               {'__slots__': ()})
+    with _frozen_lock:
+        while len(_frozen_classes) >= _FROZEN_MAX:
+            _frozen_classes.popitem(last=False)
+        return _frozen_classes.setdefault(key, cls)
+
+
+ConfigChange = namedtuple('ConfigChange', 'section option old new')
+ConfigChange.__doc__ = """A change to an option delivered to the callbacks
+registered with :py:meth:`ConfigSection.subscribe`.  *section* is the dotted
+path of the section and *old* is :py:data:`MISSING` for a new option."""
+
+
+@contextmanager
+def _override_context(sections):
+    "Push a layer of option values for the current context."
+    global _overrides_active
+    _replace_override(_Override(_current_override(), sections))
+    with _overrides_lock:
+        _overrides_active += 1
+    try:
+        yield
+    finally:
+        with _overrides_lock:
+            _overrides_active -= 1
+        # The layer may have been copied by a write since it was pushed.
+        _replace_override(_current_override().parent)
+
+
+class _Override(object):
+    """A layer of option values pushed by :py:meth:`Config.override`.  The
+    layers of a context form a linked stack through *parent*.  *sections*
+    maps the id of each overridden :py:class:`ConfigSection` to the
+    *(section, options)* pair holding its values."""
+
+    __slots__ = ('parent', 'sections')
+
+    def __init__(self, parent, sections):
+        self.parent = parent
+        self.sections = sections
+
+
+# The number of override layers in use by any context.  Option reads only
+# look for an override while it is non-zero.
+_overrides_active = 0
+_overrides_lock = threading.Lock()
+
+if contextvars is not None:
+    _override_top = contextvars.ContextVar('funconf_override', default=None)
+
+    def _current_override():
+        return _override_top.get()
+
+    def _replace_override(layer):
+        _override_top.set(layer)
+else:
+    _override_local = threading.local()
+
+    def _current_override():
+        return getattr(_override_local, 'top', None)
+
+    def _replace_override(layer):
+        _override_local.top = layer
+
+
+def _overridden(section, option):
+    """Return the options dict of the innermost override of option in
+    section for the current context, or None."""
+    layer = _current_override()
+    key = id(section)
+    while layer is not None:
+        entry = layer.sections.get(key)
+        if entry is not None and option in entry[1]:
+            return entry[1]
+        layer = layer.parent
+    return None
+
+
+def _set_overridden(section, option, value):
+    """Set option in section to value in its innermost override for the
+    current context and return True, or return False if it is not
+    overridden.  The layers down to that override are copied rather than
+    changed, so other contexts that share them, such as child asyncio
+    tasks, keep their values."""
+    layer = _current_override()
+    key = id(section)
+    outer = []
+    while layer is not None:
+        entry = layer.sections.get(key)
+        if entry is not None and option in entry[1]:
+            break
+        outer.append(layer)
+        layer = layer.parent
+    else:
+        return False
+    options = dict(entry[1])
+    options[option] = value
+    sections = dict(layer.sections)
+    sections[key] = (entry[0], options)
+    layer = _Override(layer.parent, sections)
+    for above in reversed(outer):
+        layer = _Override(layer, above.sections)
+    _replace_override(layer)
+    return True
+
+
+def _override_reaches(keys):
+    """Return True if one of the *(section, option)* keys, or an option read
+    by a :py:class:`Lazy` or interpolated value among them, is overridden in
+    the current context.  A template whose references have not been recorded
+    yet is taken to reach an override."""
+    seen = set()
+    stack = list(keys)
+    while stack:
+        section, option = stack.pop()
+        if (id(section), option) in seen:
+            continue
+        seen.add((id(section), option))
+        if _overridden(section, option) is not None:
+            return True
+        value = section._options.get(option)
+        if type(value) is Lazy:
+            if value._keys is None:
+                value._keys = value._resolve(section)
+            stack.extend(value._keys)
+        elif _templated(value) and section._config is not None:
+            config = section._config
+            deps = config._deps.get((section._section, option))
+            if deps is None:
+                return True
+            for path, name in deps:
+                target = config._paths.get(path)
+                if target is not None:
+                    stack.append((target, name))
+    return False
+
+
+AccessStats = namedtuple('AccessStats', 'reads last_read')
+AccessStats.__doc__ = """The reads of an option reported by
+:py:meth:`Config.access_stats`.  *reads* is the number of reads, estimated
+from the sampled reads, and *last_read* is the ``time.time()`` of the last
+sampled read or None."""
+
+# The number of Config objects tracking access.  Option reads are only
+# recorded while it is non-zero.
+_tracking = 0
+_tracking_lock = threading.Lock()
+
+
+class _AccessTracker(object):
+    """The sampled option reads of a :py:class:`Config` object.  Each of its
+    sections holds the tracker while access is tracked."""
+
+    __slots__ = ('sample', 'tick', 'stats')
+
+    def __init__(self, sample):
+        self.sample = sample
+        self.tick = 0
+        self.stats = {}
+
+    def read(self, section, option):
+        "Record a read of option in section if it is sampled."
+        self.tick += 1
+        if self.tick % self.sample or option not in section._options:
+            return
+        key = (section._section, option)
+        stat = self.stats.get(key)
+        if stat is None:
+            stat = self.stats[key] = [0, None]
+        stat[0] += self.sample
+        stat[1] = time.time()
+
+
+class _BatchState(threading.local):
+    """The changes collected by the :py:meth:`Config.batch` block open in
+    the current thread, or None."""
+
+    changes = None
+
+
+# Set once an option value may be computed when it is read: a Config object
+# interpolates references or a Lazy value has been made.  Option reads only
+# look for computed values while it is set.
+_computed = False
+_reference = re.compile(r'\$(\$)?\{([^}]*)\}')
+
+
+def _templated(value):
+    "Return True if value is a string that holds a ${...} reference."
+    try:
+        return isinstance(value, basestring) and '${' in value
+    except TypeError:
+        return False
+
+
+def _computed_value(section, option, value):
+    """Return the value read for option: its references resolved if its
+    section interpolates, or the result of a :py:class:`Lazy` value."""
+    if type(value) is Lazy:
+        return value.get(section, option)
+    config = section._config
+    if config is not None and config._interpolate and _templated(value):
+        return config._interpolated(section, option, value)
+    return value
+
+
+def _stamp(keys):
+    """Return a stamp for the *(section, option)* pairs in keys that differs
+    once one of the options is set to a new value.  Within a
+    :py:class:`Config` object it holds option generations, otherwise the
+    stored values."""
+    stamp = []
+    for section, option in keys:
+        config = section._config
+        if config is not None:
+            stamp.append(config.option_generation(section._section, option))
+        else:
+            stamp.append(section._options[option])
+    return stamp
+
+
+def _same_stamp(a, b):
+    "Return True if the stamps a and b are the same."
+    return (a is not None and b is not None and len(a) == len(b) and
+            all(_same(x, y) for x, y in zip(a, b)))
+
+
+def _is_computed(value):
+    "Return True if the value read for value may differ from it."
+    return type(value) is Lazy or _templated(value)
+
+
+class Lazy(object):
+    """An option value computed by *factory* the first time it is read and
+    kept until the option or one of its *inputs* changes.  For example::
+
+        config.set('log', 'pattern', r'^\\d+')
+        config.set('log', 'regex', Lazy(re.compile, ['pattern']))
+        config.log.regex.match('42')
+
+    The *inputs* name options in the same section, or any option by its
+    *section_option*, dotted or *(section, option)* key, and their values
+    are passed to *factory* in order.  The result is returned by attribute
+    and key reads and as the default of a decorated function.  Within a
+    :py:class:`Config` object the inputs are checked by their
+    :py:meth:`Config.option_generation`, so a read only compares a few
+    integers.
+    """
+
+    __slots__ = ('factory', 'inputs', '_keys', '_stamp', '_value')
+
+    def __init__(self, factory, inputs=()):
+        global _computed
+        _computed = True
+        self.factory = factory
+        self.inputs = list(inputs)
+        self._keys = None
+        self._stamp = None
+        self._value = MISSING
+
+    def __repr__(self):
+        return "Lazy(%r, %r)" % (self.factory, self.inputs)
+
+    def _resolve(self, section):
+        "Return the (section, option) pairs of the inputs."
+        config = section._config
+        keys = []
+        for name in self.inputs:
+            if name in section._options:
+                keys.append((section, name))
+                continue
+            found = config._resolve(name) if config is not None else None
+            if found is None:
+                raise ValueError("Lazy input '%s' of %s is not an option" %
+                                 (name, section._section))
+            keys.append(found)
+        return keys
+
+    def get(self, section, option):
+        """Return the value for option in section, calling the factory if
+        it has not been called since the inputs last changed."""
+        if self._keys is None:
+            self._keys = self._resolve(section)
+        if _overrides_active and _override_reaches(self._keys):
+            return self.factory(*[s[name] for s, name in self._keys])
+        stamp = _stamp(self._keys)
+        if self._value is MISSING or not _same_stamp(stamp, self._stamp):
+            self._value = self.factory(*[s[name] for s, name in self._keys])
+            self._stamp = stamp
+        return self._value
+
+
+_scalar_types = frozenset((type(None), bool, float, decimal.Decimal,
+                           datetime.date, datetime.datetime, datetime.time) +
+                          _integer)
+
+
+def _exact(value):
+    """Return True if value can not change in place and its repr tells it
+    apart from any unequal value."""
+    if isinstance(value, basestring) or type(value) in _scalar_types:
+        return True
+    if type(value) in (tuple, frozenset):
+        return all(_exact(item) for item in value)
+    if type(value) is FrozenDict:
+        return all(_exact(key) and _exact(item)
+                   for key, item in value.items())
+    return False
+
+
+def _same(a, b):
+    "Return True if a and b are known to be equal values."
+    if a is b:
+        return True
+    try:
+        return type(a) is type(b) and bool(a == b)
+    except Exception:
+        if numpy is not None and type(a) is numpy.ndarray:
+            return type(b) is numpy.ndarray and numpy.array_equal(a, b)
+        return False
+
+
 class ConfigSection(MutableMapping):
     """The :py:class:`ConfigSection` class is a mutable mapping object that
     represents the *option:value* items for a configuration section. 
@@ -424,9 +2086,14 @@ class ConfigSection(MutableMapping):
         2. When cast to a string it outputs YAML.
         3. As a decorator it utilises the :py:func:`wraps_parameters` to change
            the defaults of a variable kwargs function.  
+        4. Holds nested child sections that are accessible through
+           attributes.  A child is not an option, so it is not part of the
+           *MutableMapping* view.
     """
  
-    __slots__ = ('_dirty', '_options', '_section', '_reserved')
+    __slots__ = ('_dirty', '_options', '_section', '_reserved', '_sorted',
+                 '_children', '_config', '_subscribers', '_digest', '_tracker',
+                 '_derived')
 
     def __init__(self, section, options):
         """Construct a new :py:class:`ConfigSection` object.  
@@ -434,7 +2101,8 @@ class ConfigSection(MutableMapping):
         This object represents a section which contains the mappings between
         the section's options and their respective values. 
        
-        :param section: defines the name for this section.
+        :param section: defines the name for this section.  The name of a
+                        nested section is its dotted path.
         :type section: str
         :param options: kwargs to initialise this :py:class:`ConfigSection`'s
                         *option:value* 
@@ -443,25 +2111,66 @@ class ConfigSection(MutableMapping):
         self._section = section
         self._options = options
         self._dirty = True
+        self._sorted = None
+        self._children = {}
+        self._config = None
+        self._subscribers = []
+        self._digest = None
+        self._tracker = None
+        self._derived = None
 
     def __str__(self):
         "Return a YAML formated string object that represents this object."
-        return yaml.dump({self._section: dict(self)}, default_flow_style=False)
+        tree = self._tree()
+        path = self._section
+        if isinstance(path, basestring):
+            path = path.split('.')
+        else:
+            path = [path]
+        for name in reversed(path):
+            tree = {name: tree}
+        return yaml.dump(tree, default_flow_style=False)
+
+    def _tree(self):
+        "Return the options and child sections as nested dicts."
+        tree = dict((option, _thaw_value(value))
+                    for option, value in self._items())
+        if _computed:
+            # Keep references so that the tree reads back the same.
+            for option, value in self._options.items():
+                if _templated(value):
+                    tree[option] = value
+        for name, child in self._children.items():
+            tree[name] = child._tree()
+        return tree
 
     def __dir__(self):
         "Return a list of option names and the Base class attributes."
-        return dir(super(ConfigSection, self)) + list(self._options)
+        return (dir(super(ConfigSection, self)) + list(self._options) +
+                list(self._children))
 
     def __getattribute__(self, y):
-        """Return a option value where y is the *option* name.  Else, return
-        the value of a reserved word.
+        """Return a option value where y is the *option* name, or the child
+        section named y.  Else, return the value of a reserved word.
         """
         if y in ConfigSection._reserved:
             return super(ConfigSection, self).__getattribute__(y)
         else:
+            if _tracking:
+                tracker = self._tracker
+                if tracker is not None:
+                    tracker.read(self, y)
+            if _overrides_active:
+                options = _overridden(self, y)
+                if options is not None:
+                    return options[y]
             if y not in self._options:
+                if y in self._children:
+                    return self._children[y]
                 msg = "%s not defined in %s" % (y, self._section)
                 raise ConfigAttributeError(msg)
+            if _computed:
+                return _computed_value(self, y, self._options[y])
             return self._options[y]
 
     def __setattr__(self, x, y):
@@ -487,14 +2196,251 @@ class ConfigSection(MutableMapping):
         return len(self._options)
 
     def __setitem__(self, x, y):
-        "Set the option value of y for x where x is *option*."
+        """Set the option value of y for x where x is *option*.  An option
+        overridden by :py:meth:`Config.override` in the current context is
+        set in the override."""
+        config = self._config
+        if config is not None:
+            if config._arrays:
+                y = _array_value(y, config._arrays)
+            if config._immutable:
+                y = _freeze_value(y)
+        if _overrides_active and _set_overridden(self, x, y):
+            return
         self._dirty = True
-        self._options[x] = y
+        self._digest = None
+        options = self._options
+        if x in options:
+            old = options[x]
+            if (_computed and _is_computed(old) and
+                    _same(_computed_value(self, x, old), y)):
+                # Writing back the computed value keeps the reference or
+                # Lazy value.
+                return
+        else:
+            old = MISSING
+            self._sorted = None
+        if config is not None and config._store is not None:
+            config._persist(self, x, old, y)
+        options[x] = y
+        if config is not None:
+            config._changed(self, x, old, y)
+        elif self._subscribers:
+            self._notify({x: (old, y)})
+
+    def subscribe(self, callback, options=None):
+        """Call *callback* with a list of :py:class:`ConfigChange` events
+        each time options in this section change.
+
+        Changes made while a :py:class:`Config` loads or reads files, or
+        inside a :py:meth:`Config.batch` block, are delivered together once
+        it completes.  Repeated writes to an option within a batch are
+        coalesced into a single event holding the first old value and the
+        last new value, and writes that leave an option unchanged are
+        dropped.  Any other change is delivered as it is made.  For
+        example::
+
+            def rebuild_pool(changes):
+                for change in changes:
+                    print(change.option, change.old, change.new)
+
+            config.db.subscribe(rebuild_pool, options=['host', 'port'])
+
+        :param callback: called with a list of changes.
+        :type callback: callable
+        :param options: only deliver changes to these options.  By default
+                        changes to every option are delivered.
+        :type options: list of option names
+        :rtype: callback
+        """
+        if options is not None:
+            options = frozenset(options)
+        self._subscribers.append((callback, options))
+        if self._config is not None:
+            self._config._watched += 1
+        return callback
+
+    def unsubscribe(self, callback):
+        """Stop delivering changes to a *callback* registered with
+        :py:meth:`subscribe`."""
+        for index, (registered, _) in enumerate(self._subscribers):
+            if registered == callback:
+                del self._subscribers[index]
+                if self._config is not None:
+                    self._config._watched -= 1
+                return
+        raise ValueError("%r is not subscribed to %s" % (callback,
+                                                         self._section))
+
+    def _notify(self, changes):
+        """Deliver changes, a mapping of option to *(old, new)* values, to
+        the subscribers."""
+        events = [ConfigChange(self._section, option, old, new)
+                  for option, (old, new) in changes.items()
+                  if not _same(old, new)]
+        if not events:
+            return
+        for callback, options in list(self._subscribers):
+            if options is None:
+                callback(list(events))
+            else:
+                selected = [e for e in events if e.option in options]
+                if selected:
+                    callback(selected)
+
+    def _fingerprint(self):
+        """Return a digest of the options in this section whose values can
+        not change in place, and the sorted names of the other options.  It
+        is cached until an option is set, so comparing unchanged sections is
+        cheap."""
+        if self._digest is None:
+            exact, other = [], []
+            for option, value in self._options.items():
+                if _exact(value):
+                    exact.append((option, value))
+                else:
+                    other.append(option)
+            exact.sort(key=lambda i: repr(i[0]))
+            other.sort(key=repr)
+            digest = hashlib.sha1(repr(exact).encode('utf-8')).digest()
+            self._digest = (digest, tuple(other))
+        return self._digest
+
+    def _matches(self, other):
+        """Return True if this section holds the same options as the
+        :py:class:`ConfigSection` other.  Options whose values can change in
+        place, such as lists, are compared by value rather than by digest."""
+        mine = self._fingerprint()
+        if mine != other._fingerprint():
+            return False
+        theirs = other._options
+        for option in mine[1]:
+            if not _same(self._options[option], theirs[option]):
+                return False
+        return True
+
+    def freeze(self):
+        """Return an immutable snapshot of the options and child sections of
+        this :py:class:`ConfigSection` as a named tuple, so that reading an
+        option is a plain attribute read::
+
+            db = config.db.freeze()
+            db.host, db.replica.pool.size
+
+        Lists are frozen as tuples and dicts as :py:class:`FrozenDict`
+        objects, so the snapshot is hashable and can be used as a cache key
+        when every value is hashable.  Snapshots only equal snapshots with
+        the same names.  The named tuple class is cached for each set of
+        option names, so freezing again after a reload is cheap.
+
+        In field names, characters that can not be in an identifier become
+        underscores and keywords gain a trailing underscore, so ``max-size``
+        is read as ``max_size`` and ``class`` as ``class_``.
+
+        :raises ValueError: if a name does not start with a letter, or two
+                            names give the same field.
+        :rtype: named tuple
+        """
+        if _overrides_active or _computed:
+            options = dict(self._items())
+        else:
+            options = self._options
+        fields = sorted(options, key=repr)
+        values = [_freeze_value(options[field]) for field in fields]
+        for name in sorted(self._children, key=repr):
+            if name not in options:
+                fields.append(name)
+                values.append(self._children[name].freeze())
+        return _frozen_class('FrozenSection', fields, self._section)(*values)
+
+    def derive(self, factory, options=None, close=None):
+        """Return the object built by calling *factory* with the values of
+        *options* as kwargs.  The object is cached, and built again only
+        when one of *options* has changed since it was built, for example::
+
+            pool = config.db.derive(Pool, options=['host', 'port'],
+                                    close=Pool.close)
+
+        Unlike :py:attr:`dirty`, any number of readers can derive objects
+        from the same section, and changes to options that are not listed
+        leave the object alone.  When the object is rebuilt *close* is
+        called with the old object.  Within a :py:class:`Config` object the
+        options are checked by their :py:meth:`Config.option_generation`.
+
+        Inside a :py:meth:`Config.override` scope that overrides one of
+        *options*, a new object is built and returned without being cached.
+
+        :param factory: called with the options as kwargs.
+        :type factory: callable
+        :param options: the options the object is built from.  By default
+                        every option in this section.
+        :type options: list of option names
+        :param close: called with an object when it is replaced.
+        :type close: callable
+        :rtype: the object returned by *factory*
+        """
+        if options is None:
+            options = sorted(self._options, key=repr)
+        options = tuple(options)
+        for option in options:
+            if option not in self._options:
+                raise KeyError("%s is not an option of %s" % (option,
+                                                              self._section))
+        if _overrides_active and any(_overridden(self, option) is not None
+                                     for option in options):
+            return factory(**dict((o, self[o]) for o in options))
+        if self._derived is None:
+            self._derived = {}
+        key = (factory, options)
+        stamp = _stamp([(self, option) for option in options])
+        cached = self._derived.get(key)
+        if cached is not None and _same_stamp(stamp, cached[0]):
+            return cached[1]
+        obj = factory(**dict((o, self[o]) for o in options))
+        self._derived[key] = (stamp, obj)
+        if cached is not None and close is not None:
+            close(cached[1])
+        return obj
+
+    def _sorted_options(self):
+        "Return the sorted list of option names, rebuilt after an insert."
+        if self._sorted is None:
+            self._sorted = sorted(o for o in self._options
+                                  if isinstance(o, basestring))
+        return self._sorted
 
     def __getitem__(self, y):
         "Return the option value for y where y is *option*."
+        if _tracking:
+            tracker = self._tracker
+            if tracker is not None:
+                tracker.read(self, y)
+        if _overrides_active:
+            options = _overridden(self, y)
+            if options is not None:
+                return options[y]
+        if _computed:
+            return _computed_value(self, y, self._options[y])
+        return self._options[y]
+
+    def _read(self, y):
+        "Return the option value for y without counting it as a read."
+        if _overrides_active:
+            options = _overridden(self, y)
+            if options is not None:
+                return options[y]
+        if _computed:
+            return _computed_value(self, y, self._options[y])
         return self._options[y]
 
+    def _items(self):
+        "Return the *option:value* items without counting them as reads."
+        return [(option, self._read(option)) for option in self._options]
+
+    def __contains__(self, y):
+        "Return True if y is an option in this section."
+        return y in self._options
+
     @property
     def dirty(self):
         """The dirty property is a convenience property which is set when a
@@ -541,17 +2487,8 @@ class ConfigSection(MutableMapping):
         """
         if func is None:
             return functools.partial(self, lazy=lazy)
-        if lazy:
-            inner_lazy = lazy_string_cast(provide_defaults=True)(func)
-            wrapped = wraps_parameters(self,
-                                 hide_var_positional=hide_var_positional,
-                                 hide_var_keyword=hide_var_keyword)(inner_lazy)
-            return lazy_string_cast(self, provide_defaults=True)(wrapped) 
-        else:
-            wrapped = wraps_parameters(self,
-                                 hide_var_positional=hide_var_positional,
-                                 hide_var_keyword=hide_var_keyword)(func)
-            return wrapped
+        return _decorate(self, func, lazy, hide_var_positional,
+                         hide_var_keyword)
 
 
 ConfigSection._reserved = set(dir(ConfigSection))
@@ -564,18 +2501,29 @@ class Config(MutableMapping):
     The following lists the main features of this class:
 
         1. Aggregates :py:class:`ConfigSection` objects that are accessible
-           through attributes.
+           through attributes.  Sections can be nested to any depth, as in
+           ``config.db.replica.pool.size``.
         2. Exposes a translation of the configuration into section_option:value
            through a standard implementation of the *MutableMapping* abstract
-           type.
+           type.  Options can also be addressed by their dotted path, as in
+           ``config['db.replica.pool.size']``.
         3. When cast to a string it outputs YAML.
         4. As a decorator it utilises the :py:func:`wraps_parameters` to change
            the defaults of a variable kwargs function.  
     """
 
-    __slots__ = ('_sections', '_reserved', '_lookup', '_strict')
-
-    def __init__(self, filenames=[], strict=False):
+    __slots__ = ('_sections', '_reserved', '_strict', '_sorted', '_schema',
+                 '_paths', '_flat', '_batch', '_watched', '_generation',
+                 '_generations', '_log_gens', '_log_keys', '_tracked_since',
+                 '_lazy', '_cache_index', '_pending', '_loading', '_store',
+                 '_immutable', '_arrays', '_interpolate', '_resolved', '_deps',
+                 '_dependents', '_resolving', '_tracker', '_lock',
+                 '_materializing', '_shadowed', '_count', '_underscored',
+                 '_synced', '_syncing')
+
+    def __init__(self, filenames=[], strict=False, schema=None, lazy=False,
+                 cache_index=False, store=None, immutable=False,
+                 interpolate=False, arrays=False):
         """Construct a new Config object.  
         
         This is the root object for a function configuration set.  It is the
@@ -586,13 +2534,85 @@ class Config(MutableMapping):
         :param strict: If True, raise :py:class:`ConfigAttributeError` if a
                        :py:class:`ConfigSection` doesn't exist.
         :type strict: False 
+        :param schema: If set, the *section_option* values are validated by
+                       this schema each time files are read, and its casters
+                       are used when this object decorates a function.
+        :type schema: :py:class:`Schema`
+        :param lazy: If True, sections in the files read by this object are
+                     parsed the first time they are used.  See
+                     :py:meth:`read`.
+        :type lazy: False
+        :param cache_index: If True, lazily read files have their section
+                            index cached next to them.
+        :type cache_index: False
+        :param store: If set, the options are loaded from this store one top
+                      level section at a time as they are used, and every
+                      change is written through to it.  See :py:meth:`sync`.
+        :type store: :py:class:`SQLiteStore`
+        :param immutable: If True, list values are kept as tuples and dict
+                          values as :py:class:`FrozenDict` objects, so a
+                          function decorated by this object can not change
+                          them in place and no copy is made per call.
+                          Strings cast for these options are cast to tuples.
+        :type immutable: False
+        :param interpolate: If True, ``${section.option}`` references in
+                            string values are replaced by the referenced
+                            values when they are read.  See
+                            :py:meth:`references`.
+        :type interpolate: False
+        :param arrays: If True, lists of ints or of floats are kept as
+                       compact *array.array* objects, and strings cast for
+                       these options are parsed in bulk into arrays.  If
+                       'numpy', they are kept as *numpy* arrays.  Immutable
+                       objects keep them as tuples.
+        :type arrays: False
         """
+        if arrays == 'numpy' and numpy is None:
+            raise ValueError("arrays='numpy' requires numpy")
         self._sections = {}
-        self._lookup = {}
+        self._paths = {}
+        self._flat = {}
+        self._shadowed = {}
+        self._count = 0
+        self._underscored = False
         self._strict = strict 
+        self._sorted = None
+        self._schema = schema
+        self._batch = _BatchState()
+        self._watched = 0
+        self._generation = 0
+        self._generations = None
+        self._log_gens = None
+        self._log_keys = None
+        self._tracked_since = 0
+        self._lazy = lazy
+        self._cache_index = cache_index
+        self._pending = OrderedDict()
+        self._loading = None
+        self._lock = threading.RLock()
+        self._materializing = set()
+        self._store = store
+        self._synced = 0
+        self._syncing = None
+        self._immutable = immutable
+        self._arrays = arrays
+        self._interpolate = interpolate
+        self._resolved = {}
+        self._deps = {}
+        self._dependents = {}
+        self._resolving = threading.local()
+        self._tracker = None
+        if interpolate:
+            global _computed
+            _computed = True
+        if store is not None:
+            self._synced = store.sequence()
+            for name in store.sections():
+                self._pending[intern(str(name))] = [
+                    functools.partial(store.load, name)]
         self.read(filenames)
 
-    def read(self, filenames):
+    def read(self, filenames, format=None, lazy=None, cache_index=None):
         """Read and parse a filename or a list of filenames.
 
         Files that cannot be opened are silently ignored; this is designed so
@@ -601,37 +2621,210 @@ class Config(MutableMapping):
         and all existing configuration files in the list will be read.  A
         single filename may also be given.
 
-        :param filenames: YAML configuration files.
+        ``~`` and environment variables in the filenames are expanded, and a
+        file named twice is read once.  A file that does not exist is
+        skipped without another attempt by any :py:class:`Config` object for
+        the next few seconds, so that short lived objects built from the same
+        list of locations do not probe the missing ones each time.
+        :py:func:`clear_read_cache` forgets them.
+
+        The format of each file is chosen by its extension: ``.json`` files
+        are read as JSON, ``.toml`` files as TOML and any other file as YAML.
+        More formats can be added with :py:func:`register_format`.
+
+        Large regular files of a format whose parser reads buffers, such as
+        msgpack, are memory mapped and the mapped buffer is handed to the
+        parser, so the file is not first copied into a string.  Other files,
+        small files and streams such as pipes are read normally.
+
+        If this object has a :py:class:`Schema`, all of the values are
+        validated once the files have been read.
+
+        In lazy mode a YAML or JSON file is only scanned for the byte range of
+        each top level section, and a section is parsed the first time it is
+        used, for example by ``config.db`` or ``config['db_host']``.  Sections
+        that are never used are never parsed.  With *cache_index* the ranges
+        are saved to *filename.idx* and reused while the file's size and
+        modification time are unchanged, so the scan is skipped as well.
+        Large files are memory mapped for the scan, and the byte range of
+        each section is copied out before the map is closed, so a file
+        changed after it is read can not affect the pending sections.  Files
+        that can not be split into independent sections, such as YAML with
+        anchors, are read in full.  Sections loaded on first use are not
+        reported as changes.  Schema validation loads the sections that the
+        schema covers.
+
+        :param filenames: configuration files.
         :type filenames: list of filepaths
-        :rtype: list of successfully read files.
+        :param format: the format of every file, instead of choosing by
+                       extension.
+        :type format: str
+        :param lazy: parse sections on first use.  Defaults to the *lazy*
+                     value given to this object.
+        :type lazy: bool
+        :param cache_index: cache the section ranges of lazily read files.
+                            Defaults to the *cache_index* value given to this
+                            object.
+        :type cache_index: bool
+        :raises SchemaError: if a value does not conform to the schema.
+        :rtype: list of successfully read files, as they were given.
         """
         if isinstance(filenames, basestring):
             filenames = [filenames]
+        if lazy is None:
+            lazy = self._lazy
+        if cache_index is None:
+            cache_index = self._cache_index
         read_ok = []
-        for filename in filenames:
-            try:
-                with open(filename) as f:
-                    self.load(f)
-                read_ok.append(filename)
-            except IOError:
-                pass
+        with self.batch():
+            for given, filename in _candidates(filenames):
+                if _known_missing(filename):
+                    continue
+                backend = _format_for(format, filename)
+                content = None
+                try:
+                    if lazy and backend.name in _scanners:
+                        self._read_lazy(filename, backend, cache_index)
+                    else:
+                        with open(filename, 'rb') as f:
+                            if backend.buffer:
+                                content, _ = _map_file(f)
+                            if content is None:
+                                self.load(f, format=backend.name)
+                    if content is not None:
+                        try:
+                            self.load(content, format=backend.name)
+                        finally:
+                            content.close()
+                    read_ok.append(given)
+                except IOError as exc:
+                    if exc.errno == errno.ENOENT:
+                        _mark_missing(filename)
+            if self._schema is not None:
+                self._schema.validate(self)
+        if self._interpolate:
+            self.references()
         return read_ok
 
-    def load(self, stream):
+    def load(self, stream, format=None):
         """Parse the first YAML document from stream then load the
         *section:option:value* elements into this :py:class:`Config` object.
+        A mapping found as an option value is loaded as a nested section.
 
-        :param stream: the configuration to be loaded using ``yaml.load``.
-        :type stream: stream object
+        :param stream: the configuration to be loaded.
+        :type stream: stream object or str
+        :param format: the format of the stream.  If not set, it is chosen by
+                       the extension of the stream's name, or else YAML.
+        :type format: str
         """
-        config = yaml.safe_load(stream)
+        backend = _format_for(format, getattr(stream, 'name', None))
+        if backend.loads is None:
+            raise ValueError("Can not read the %s format" % backend.name)
+        if backend.name == 'yaml' or (backend.buffer and
+                                      isinstance(stream, mmap.mmap)):
+            config = backend.loads(stream)
+        else:
+            if hasattr(stream, 'read'):
+                stream = stream.read()
+            if isinstance(stream, bytes) and not backend.binary:
+                stream = stream.decode('utf-8')
+            config = backend.loads(stream)
+        self._load_tree(config)
+        if self._interpolate and self._batch.changes is None:
+            self.references()
+
+    def _load_tree(self, config):
+        "Load the sections of a parsed configuration document."
         if not isinstance(config, dict):
             return
-        for section, options in config.items():
-            if not isinstance(options, dict):
-                continue
-            for option, value in options.items():
-                self.set(section, option, value)
+        with self.batch():
+            for section, options in config.items():
+                if not isinstance(options, dict):
+                    continue
+                self._load(section, options)
+
+    def _read_lazy(self, filename, backend, cache_index):
+        """Index the top level sections of filename and leave them pending
+        until they are used."""
+        with open(filename, 'rb') as f:
+            mapped, st = _map_file(f)
+            content = f.read() if mapped is None else mapped
+        try:
+            self._index(content, mapped is not None, filename, st, backend,
+                        cache_index)
+        finally:
+            if mapped is not None:
+                mapped.close()
+
+    def _index(self, content, mapped, filename, st, backend, cache_index):
+        """Leave the top level sections of the bytes or mapped content
+        pending.  The byte ranges of a mapped file are copied, so the map can
+        be closed."""
+        scan, loads = _scanners[backend.name]
+        sections = None
+        if cache_index and st is not None:
+            sections = _read_index(filename + '.idx', st, backend.name)
+        if sections is None:
+            sections = scan(content)
+            if sections is None:
+                self.load(content, format=backend.name)
+                return
+            if cache_index and st is not None:
+                _write_index(filename + '.idx', st, backend.name, sections)
+        for name, start, end in sections:
+            if type(name) is str:
+                name = intern(name)
+            if mapped:
+                entry = functools.partial(_parse_range, content[start:end],
+                                          0, end - start, loads, name)
+            else:
+                entry = functools.partial(_parse_range, content, start, end,
+                                          loads, name)
+            if name in self._paths:
+                self._load_tree(entry())
+            else:
+                self._pending.setdefault(name, []).append(entry)
+
+    def _materialize(self, name):
+        """Parse and load the pending top level section name.
+
+        The section stays pending until it is fully loaded so that other
+        threads wait on the lock rather than see it half loaded.
+        """
+        with self._lock:
+            entries = self._pending.get(name)
+            if entries is None or name in self._materializing:
+                return
+            self._materializing.add(name)
+            loading, self._loading = self._loading, threading.current_thread()
+            try:
+                for entry in entries:
+                    self._load_tree(entry())
+            finally:
+                self._loading = loading
+                self._materializing.discard(name)
+                self._pending.pop(name, None)
+
+    def _load_pending(self, path):
+        "Load the pending top level section of the dotted path, if any."
+        if isinstance(path, basestring) and '.' in path:
+            path = path.split('.', 1)[0]
+        if path in self._pending:
+            self._materialize(path)
+
+    def _materialize_all(self):
+        "Parse and load every pending section."
+        for name in list(self._pending):
+            self._materialize(name)
+
+    def _load(self, path, options):
+        "Load the options mapping into the section at path."
+        self._add_section(path)
+        for option, value in options.items():
+            if isinstance(value, dict):
+                self._load("%s.%s" % (path, option), value)
+            else:
+                self.set(path, option, value)
 
     def set(self, section, option, value):
         """Set an option.
@@ -643,22 +2836,735 @@ class Config(MutableMapping):
             print(dir(funconf.Config))
             print(dir(funconf.ConfigOption))
 
+        A nested section is named by its dotted path, for example
+        ``config.set('db.replica.pool', 'size', 4)``.  Missing parent sections
+        are created.
+
         :param section: Name of the section to add the option into.
         :type section: str
         :param option:  Name of the option.
         :type option: str
         :param value:   Value assigned to this option.
         """
-        if section in Config._reserved:
-            raise ValueError("%s is a reserved Config word" % option)
+        if self._pending:
+            self._load_pending(section)
+        if section in self._paths:
+            target = self._paths[section]
+        else:
+            names = [section]
+            if isinstance(section, basestring) and '.' in section:
+                names = section.split('.')
+            if names[0] in Config._reserved:
+                raise ValueError("%s is a reserved Config word" % names[0])
+            for name in names[1:]:
+                if name in ConfigSection._reserved:
+                    raise ValueError("%s is a reserved ConfigSection word" %
+                                     name)
+            target = self._add_section(section)
         if option in ConfigSection._reserved:
             raise ValueError("%s is a reserved ConfigSection word" % option)
-        key = "%s_%s" % (section, option)
-        self._lookup[key] = (section, option)
-        self[key] = value
+        if type(option) is str:
+            option = intern(option)
+        target[option] = value
+        if self._shadowed:
+            key = self._flat_key(target, option)[1]
+            if key in self._shadowed:
+                self._shadowed[key] = (target, option)
+
+    def override(self, overrides=None, **options):
+        """Return a context manager that overrides option values for the
+        current thread or asyncio task until it exits.  Options are named by
+        *section_option* keyword or by the keys of the *overrides* mapping,
+        which may also be dotted or *(section, option)* keys.  For
+        example::
+
+            with config.override(db_host='localhost', db_port=5433):
+                connect()
+
+        Reads of an overridden option return the override, and writes to it,
+        including those made by a decorated function, change the override
+        rather than this object.  Subscribers are not notified.  Overrides
+        can be nested, in which case the innermost value wins.
+
+        Entering and leaving an override costs one step per option given.
+        Writing to an overridden option copies the override, so that asyncio
+        tasks started within it keep the values they started with.  While
+        no override is in use anywhere, reading an option costs the same as
+        before.
+
+        :param overrides: option values keyed as for :py:meth:`__getitem__`.
+        :type overrides: mapping
+        :raises ValueError: if an option does not exist.
+        """
+        if overrides is not None:
+            options = dict(overrides, **options)
+        sections = {}
+        for key, value in options.items():
+            found = self._resolve(key)
+            if found is None:
+                raise ValueError("There is no section for '%s'" % (key,))
+            section, option = found
+            if self._arrays:
+                value = _array_value(value, self._arrays)
+            if self._immutable:
+                value = _freeze_value(value)
+            entry = sections.get(id(section))
+            if entry is None:
+                entry = sections[id(section)] = (section, {})
+            entry[1][option] = value
+        return _override_context(sections)
+
+    @contextmanager
+    def batch(self):
+        """Return a context manager that delivers the changes made within it
+        to the :py:meth:`ConfigSection.subscribe` callbacks as one batch when
+        it exits.  Batches can be nested, in which case the outermost batch
+        delivers the changes.  For example::
+
+            with config.batch():
+                config.set('db', 'host', 'db2')
+                config.set('db', 'port', 5433)
+
+        A batch belongs to the thread that opened it; changes made by other
+        threads meanwhile are delivered as usual.  Changes are not undone if
+        the block raises, so the changes made before the exception are still
+        delivered, and committed to the store, before it propagates.
+        """
+        state = self._batch
+        if state.changes is not None:
+            yield self
+            return
+        state.changes = OrderedDict()
+        try:
+            yield self
+        finally:
+            batch, state.changes = state.changes, None
+            if self._store is not None:
+                self._store.commit()
+            if batch:
+                self._dispatch(batch)
+
+    def sync(self):
+        """Apply the options written to the store of this object, by other
+        connections or processes, since it was created or last synced.  Only
+        the rows written since then are read.  Sections that have not been
+        loaded yet are left to load the latest values when first used, and
+        new top level sections are added to them.  The options whose values
+        differ are set and reported as changed, and are not written back to
+        the store.
+
+        :raises ValueError: if this object has no store.
+        :rtype: list of *(section, option)* tuples set
+        """
+        if self._store is None:
+            raise ValueError("Config object has no store to sync with")
+        applied = []
+        with self._lock:
+            self._synced, rows = self._store.changes(self._synced)
+            syncing, self._syncing = self._syncing, threading.current_thread()
+            try:
+                for section, option, value in rows:
+                    top = intern(str(section.split('.', 1)[0]))
+                    if top in self._pending:
+                        continue
+                    if top not in self._paths:
+                        self._pending[top] = [
+                            functools.partial(self._store.load, top)]
+                        continue
+                    target = self._paths.get(section)
+                    if (target is not None and
+                            _same(target._options.get(option, MISSING),
+                                  value)):
+                        continue
+                    self.set(section, option, value)
+                    applied.append((section, option))
+            finally:
+                self._syncing = syncing
+        return applied
+
+    @property
+    def generation(self):
+        """The generation number of this :py:class:`Config` object.  It is
+        incremented by each write that changes the value of an option, and
+        the generation of that change is recorded for the option.  Pass a
+        generation number to :py:meth:`changes_since` to find the options
+        that have changed after it.
+
+        Change tracking begins the first time this property is read, so
+        configurations that never use it carry no per option records.
+
+        :rtype: int
+        """
+        if self._generations is None:
+            self._track()
+        return self._generation
+
+    def _track(self):
+        "Begin recording the generation of each change."
+        self._generations = {}
+        self._log_gens = []
+        self._log_keys = []
+        self._tracked_since = self._generation
+
+    def option_generation(self, section, option):
+        """Return the generation of the last change to *option* in
+        *section*.  An option that has not changed since tracking began
+        reports the generation at which tracking began.
+
+        :param section: Name or dotted path of the section.
+        :type section: str
+        :param option:  Name of the option.
+        :type option: str
+        :rtype: int
+        """
+        if self._generations is None:
+            self._track()
+        return self._generations.get((section, option), self._tracked_since)
+
+    def changes_since(self, generation):
+        """Return the *(section, option)* pairs that changed after
+        *generation*, ordered by their last change.
+
+        Changes are kept in a log ordered by generation, so the cost is
+        proportional to the number of changes made after *generation*.  If
+        *generation* predates change tracking every option is returned.
+
+        :param generation: a value previously read from :py:attr:`generation`.
+        :type generation: int
+        :rtype: list of *(section, option)* tuples.
+        """
+        if self._generations is None or generation < self._tracked_since:
+            if self._generations is None:
+                self._track()
+            self._materialize_all()
+            return [(path, option) for path, section in self._paths.items()
+                    for option in section._options]
+        generations = self._generations
+        log_gens, log_keys = self._log_gens, self._log_keys
+        pairs = []
+        for index in range(bisect_right(log_gens, generation), len(log_gens)):
+            key = log_keys[index]
+            if generations[key] == log_gens[index]:
+                pairs.append(key)
+        return pairs
+
+    def _record(self, key):
+        "Record a new generation for the (section, option) key."
+        self._generation += 1
+        self._generations[key] = self._generation
+        log_gens, log_keys = self._log_gens, self._log_keys
+        log_gens.append(self._generation)
+        log_keys.append(key)
+        if len(log_gens) > 2 * len(self._generations) + 64:
+            # Drop log entries for options that have changed again since.
+            latest = sorted((g, k) for k, g in self._generations.items())
+            self._log_gens = [g for g, _ in latest]
+            self._log_keys = [k for _, k in latest]
+
+    def _changed(self, section, option, old, new):
+        """Record a change to an option made through the
+        :py:class:`ConfigSection` section.  The options whose references
+        depend on it change with it."""
+        if old is MISSING:
+            self._added(section, option)
+        key = (section._section, option)
+        loading = (self._loading is not None and
+                   self._loading is threading.current_thread())
+        dependents = ()
+        if self._interpolate:
+            dependents = self._invalidate(key)
+            if _templated(new) and not loading:
+                self._link(key, new)
+        if loading:
+            return
+        changed = not _same(old, new)
+        if not changed:
+            dependents = ()
+        if self._generations is not None and changed:
+            self._record(key)
+            for dependent, _ in dependents:
+                self._record(dependent)
+        if not self._watched:
+            return
+        batch = self._batch.changes
+        if batch is None:
+            if section._subscribers:
+                section._notify({option: (old, new)})
+            for (path, name), previous in dependents:
+                target = self._paths.get(path)
+                if target is not None and target._subscribers:
+                    target._notify({name: (previous, target[name])})
+            return
+        self._batched(batch, key, old, new)
+        for dependent, previous in dependents:
+            self._batched(batch, dependent, previous, _RESOLVE)
+
+    def _flat_key(self, section, option):
+        "Return the flat section path and *section_option* key of option."
+        path = section._section
+        if isinstance(path, basestring):
+            path = path.replace('.', '_')
+        return path, "%s_%s" % (path, option)
+
+    def _added(self, section, option):
+        """Count the new option of section in the *section_option* view.  If
+        another option has the same key, the key addresses the newest one
+        until :py:meth:`set` sets the other."""
+        # Two options share a key, or two sections a flat name, only if a
+        # section name holds an underscore.
+        if not self._underscored:
+            self._count += 1
+            return
+        path, key = self._flat_key(section, option)
+        flat = self._flat
+        if flat.get(path) is not section:
+            return
+        if key.count('_') > 1:
+            index = key.find('_')
+            while index != -1:
+                other = flat.get(key[:index])
+                name = key[index + 1:]
+                if (other is not None and name in other._options and
+                        (other is not section or name != option)):
+                    self._shadowed[key] = (section, option)
+                    return
+                index = key.find('_', index + 1)
+        self._count += 1
+
+    def _persist(self, section, option, old, new):
+        """Write a change to an option to the store before the option is
+        set, so that a value the store can not keep leaves it unchanged."""
+        current = threading.current_thread()
+        if (self._loading is current or self._syncing is current or
+                _same(old, new)):
+            return
+        if self._immutable:
+            new = _thaw_value(new)
+        self._store.put(section._section, option, new)
+        if self._batch.changes is None and self._store.autocommit:
+            self._store.commit()
+
+    def _batched(self, batch, key, old, new):
+        "Add the change of the (section, option) key to batch."
+        changes = batch.get(key[0])
+        if changes is None:
+            changes = batch[key[0]] = OrderedDict()
+        if key[1] in changes:
+            old = changes[key[1]][0]
+        changes[key[1]] = (old, new)
+
+    def track_access(self, sample=1):
+        """Start recording the reads of the options in this object, whether
+        they are read as attributes, by key, or as the defaults of a
+        decorated function.  Only one in every *sample* reads is recorded,
+        which keeps the cost low for options read in tight loops.  The counts
+        are reported by :py:meth:`access_stats`, and are kept when tracking
+        is stopped.
+
+        :param sample: record one in this many reads, or 0 to stop.
+        :type sample: int
+        """
+        global _tracking
+        if sample < 0:
+            raise ValueError("sample must not be negative")
+        tracker = self._tracker
+        if tracker is None:
+            tracker = self._tracker = _AccessTracker(0)
+        with _tracking_lock:
+            _tracking += bool(sample) - bool(tracker.sample)
+        tracker.sample = sample
+        for section in self._paths.values():
+            section._tracker = tracker if sample else None
+
+    def access_stats(self):
+        """Return the :py:class:`AccessStats` of every option recorded since
+        :py:meth:`track_access` was called, keyed by *(section, option)*.
+        Options that have not been read report zero reads, so the options
+        that are never used can be found.
+
+        :rtype: dict
+        """
+        self._materialize_all()
+        unread = AccessStats(0, None)
+        access = self._tracker.stats if self._tracker is not None else {}
+        stats = {}
+        for path, section in self._paths.items():
+            for option in section._options:
+                stat = access.get((path, option))
+                stats[(path, option)] = (unread if stat is None else
+                                         AccessStats(stat[0], stat[1]))
+        return stats
+
+    def references(self):
+        """Resolve every ``${section.option}`` reference and return the
+        dependency graph, which maps each *(section, option)* pair holding
+        references to the set of pairs it refers to.
+
+        A reference names an option by its dotted path or *section_option*
+        key.  A value that is a single reference takes the type of the
+        referenced value, otherwise the referenced values are formatted into
+        the string.  ``$${`` is written as a literal ``${``.
+
+        The graph is built as values are first resolved, and this method is
+        called after each read or load, so that missing options and cycles
+        are found early.  Resolved values are cached.  Changing an option
+        only drops the cached values of the options that depend on it, which
+        are resolved again the next time they are read.  Those options are
+        reported as changed too, both by :py:meth:`changes_since` and to
+        :py:meth:`ConfigSection.subscribe` callbacks.
+
+        :raises ValueError: if a reference names a missing option or the
+                            references form a cycle.
+        :rtype: dict
+        """
+        for path, section in list(self._paths.items()):
+            for option, value in list(section._options.items()):
+                if _templated(value):
+                    self._interpolated(section, option, value)
+        return dict((key, set(deps)) for key, deps in self._deps.items())
+
+    def _interpolated(self, section, option, template):
+        "Return the cached or newly resolved value of a template."
+        key = (section._section, option)
+        shadowed = (_overrides_active and
+                    _override_reaches([(section, option)]))
+        if not shadowed:
+            value = self._resolved.get(key, MISSING)
+            if value is not MISSING:
+                return value
+        # Each thread resolves with its own stack, so that two threads
+        # resolving the same option are not taken for a cycle.
+        resolving = getattr(self._resolving, 'stack', None)
+        if resolving is None:
+            resolving = self._resolving.stack = []
+        if key in resolving:
+            cycle = resolving[resolving.index(key):] + [key]
+            raise ValueError("Interpolation cycle: %s" % " -> ".join(
+                "%s.%s" % pair for pair in cycle))
+        deps = set()
+
+        def lookup(ref):
+            found = self._resolve(ref)
+            if found is None:
+                raise ValueError("Can not interpolate '%s' in %s.%s" % (
+                                 ref, key[0], key[1]))
+            target, name = found
+            deps.add((target._section, name))
+            return target[name]
+
+        resolving.append(key)
+        try:
+            match = _reference.match(template)
+            if (match is not None and match.end() == len(template) and
+                    match.group(1) is None):
+                value = lookup(match.group(2))
+            else:
+                value = _reference.sub(
+                    lambda m: ("${%s}" % m.group(2) if m.group(1) else
+                               str(lookup(m.group(2)))), template)
+        finally:
+            resolving.pop()
+        self._deps[key] = deps
+        for dep in deps:
+            self._dependents.setdefault(dep, set()).add(key)
+        if not shadowed:
+            self._resolved[key] = value
+        return value
+
+    def _invalidate(self, key):
+        """Drop the resolved value of key and of the options that depend on
+        it.  Return the *(key, old value)* pairs of the options that depend
+        on it, where the old value is MISSING if it had not been resolved."""
+        for dep in self._deps.pop(key, ()):
+            dependents = self._dependents.get(dep)
+            if dependents is not None:
+                dependents.discard(key)
+        changed = []
+        self._resolved.pop(key, None)
+        stack = list(self._dependents.get(key, ()))
+        seen = set([key])
+        while stack:
+            key = stack.pop()
+            if key in seen:
+                continue
+            seen.add(key)
+            changed.append((key, self._resolved.pop(key, MISSING)))
+            stack.extend(self._dependents.get(key, ()))
+        return changed
+
+    def _link(self, key, template):
+        """Record the options that the references in template depend on
+        before it is first resolved."""
+        deps = set()
+        for match in _reference.finditer(template):
+            if match.group(1) is None:
+                found = self._resolve(match.group(2))
+                if found is not None:
+                    deps.add((found[0]._section, found[1]))
+        self._deps[key] = deps
+        for dep in deps:
+            self._dependents.setdefault(dep, set()).add(key)
+
+    def _dispatch(self, batch):
+        "Deliver a batch of changes to the subscribers of each section."
+        for path, changes in batch.items():
+            section = self._paths.get(path)
+            if section is not None and section._subscribers:
+                for option, (old, new) in list(changes.items()):
+                    if new is _RESOLVE:
+                        changes[option] = (old, section[option])
+                section._notify(changes)
+
+    def diff(self, other):
+        """Return the options added, removed and changed to get from this
+        :py:class:`Config` to *other*.
+
+        Each section caches a digest of its options, so sections whose
+        content matches are skipped without comparing their options.  Only
+        values that can change in place, such as lists and dicts, are
+        compared each time.  Comparing two large configurations that differ
+        in a few sections only compares the options of those sections.
+
+        :param other: the configuration to compare against.
+        :type other: :py:class:`Config`
+        :rtype: :py:class:`ConfigDiff`
+        """
+        self._materialize_all()
+        other._materialize_all()
+        added, removed, changed = [], [], []
+        for path, section in self._paths.items():
+            theirs = other._paths.get(path)
+            if theirs is None:
+                removed.extend((path, option) for option in section._options)
+                continue
+            if section._matches(theirs):
+                continue
+            mine, their_options = section._options, theirs._options
+            for option, value in mine.items():
+                if option not in their_options:
+                    removed.append((path, option))
+                elif not _same(value, their_options[option]):
+                    changed.append((path, option))
+            added.extend((path, option) for option in their_options
+                         if option not in mine)
+        for path, theirs in other._paths.items():
+            if path not in self._paths:
+                added.extend((path, option) for option in theirs._options)
+        return ConfigDiff(sorted(added, key=repr), sorted(removed, key=repr),
+                          sorted(changed, key=repr))
+
+    def merge(self, other, strategy='replace'):
+        """Merge the options of *other* into this :py:class:`Config` object.
+
+        The *strategy* decides how a value in *other* is merged into an
+        existing value:
+
+            replace:
+                The value from *other* replaces the existing value.
+
+            append:
+                Lists are concatenated and dicts are merged key by key.
+
+            union:
+                Items of a list from *other* that are not already in the
+                existing list are appended, and dicts are merged key by key.
+
+        A callable strategy is called with *(old, new)* and returns the
+        merged value.  Sections whose content matches are skipped, and the
+        changes are delivered to subscribers as one batch.
+
+        :param other: the configuration to merge in.
+        :type other: :py:class:`Config`
+        :param strategy: 'replace', 'append', 'union' or a callable.
+        """
+        if not callable(strategy) and strategy not in ('replace', 'append',
+                                                       'union'):
+            raise ValueError("Unknown merge strategy '%s'" % (strategy,))
+        other._materialize_all()
+        with self.batch():
+            for path, theirs in other._paths.items():
+                section = self._paths.get(path)
+                if section is None:
+                    section = self._add_section(path)
+                elif section._matches(theirs):
+                    continue
+                mine = section._options
+                for option, value in theirs._options.items():
+                    if option in mine and strategy != 'replace':
+                        old = mine[option]
+                        if callable(strategy):
+                            value = strategy(old, value)
+                        else:
+                            value = _merge_values(old, value, strategy)
+                    if option not in mine or not _same(mine[option], value):
+                        self.set(path, option, value)
+
+    def _add_section(self, path):
+        """Return the :py:class:`ConfigSection` at the dotted *path*, creating
+        it and any missing parent sections.
+
+        Every section is indexed by its dotted path and by its *section* name
+        in the *section_option* view, which is the path joined by
+        underscores.  Resolving a path costs a single lookup however deep the
+        section is nested.
+        """
+        section = self._paths.get(path)
+        if section is not None:
+            return section
+        if self._pending:
+            self._load_pending(path)
+            section = self._paths.get(path)
+            if section is not None:
+                return section
+        if type(path) is str:
+            path = intern(path)
+        parent = None
+        name = path
+        if isinstance(path, basestring) and '.' in path:
+            parent_path, name = path.rsplit('.', 1)
+            parent = self._add_section(parent_path)
+        section = ConfigSection(path, {})
+        section._config = self
+        if self._tracker is not None and self._tracker.sample:
+            section._tracker = self._tracker
+        if parent is None:
+            self._sections[name] = section
+        else:
+            parent._children[name] = section
+        self._paths[path] = section
+        if isinstance(path, basestring):
+            flat = path.replace('.', '_')
+            self._flat.setdefault(flat, section)
+            if '_' in flat:
+                self._underscored = True
+        else:
+            self._flat.setdefault(path, section)
+        self._sorted = None
+        return section
+
+    def query(self, section='*', option='*'):
+        """Return the sorted list of *(section, option)* pairs matching the
+        shell style *section* and *option* patterns.  For example::
+
+            config.query('db*', 'pool_*')
+
+        Section paths and option names are kept in sorted indexes, so a
+        pattern with a literal prefix such as ``'pool_*'`` only visits the
+        names that begin with ``'pool_'``.  Unlike the *section_option* keys,
+        the pairs are never ambiguous.  Nested sections are matched by their
+        dotted path.
+
+        :param section: pattern for the section names.
+        :type section: str
+        :param option: pattern for the option names.
+        :type option: str
+        :rtype: list of *(section, option)* tuples.
+        """
+        self._materialize_all()
+        if self._sorted is None:
+            self._sorted = sorted(s for s in self._paths
+                                  if isinstance(s, basestring))
+        pairs = []
+        for section_name in _match_sorted(self._sorted, self._paths,
+                                          section):
+            options = self._paths[section_name]
+            for option_name in _match_sorted(options._sorted_options(),
+                                             options._options, option):
+                pairs.append((section_name, option_name))
+        return pairs
+
+    def freeze(self):
+        """Return an immutable snapshot of this :py:class:`Config` object as
+        a named tuple of its frozen sections.  See
+        :py:meth:`ConfigSection.freeze`.
+
+        :rtype: named tuple
+        """
+        self._materialize_all()
+        sections = self._sections
+        fields = sorted(sections, key=repr)
+        return _frozen_class('FrozenConfig', fields, 'config')(
+            *[sections[field].freeze() for field in fields])
+
+    def _resolve(self, key):
+        """Return the (:py:class:`ConfigSection`, option) pair addressed by
+        the *section_option*, dotted *section.option* or *(section, option)*
+        key, or None if no option is addressed.
+
+        No per option key is stored for the *section_option* view.  Instead,
+        the key is split at each underscore from left to right until a section
+        holding the remainder as an option is found.  When two pairs join to
+        the same key the pair last given to :py:meth:`set`, or else the newest
+        pair, is addressed.  Only such keys are stored.
+        """
+        if self._pending:
+            self._resolve_pending(key)
+        if isinstance(key, tuple) and len(key) == 2:
+            section = self._paths.get(key[0])
+            if section is not None and key[1] in section._options:
+                return section, key[1]
+            return None
+        if not isinstance(key, basestring):
+            return None
+        if '.' in key:
+            paths = self._paths
+            index = key.rfind('.')
+            while index != -1:
+                section = paths.get(key[:index])
+                if section is not None and key[index + 1:] in section._options:
+                    return section, key[index + 1:]
+                index = key.rfind('.', 0, index)
+            return None
+        if self._shadowed:
+            found = self._shadowed.get(key)
+            if found is not None:
+                return found
+        sections = self._flat
+        index = key.find('_')
+        while index != -1:
+            section = sections.get(key[:index])
+            if section is not None and key[index + 1:] in section._options:
+                return section, key[index + 1:]
+            index = key.find('_', index + 1)
+        return None
+
+    def _resolve_pending(self, key):
+        "Load the pending sections that key could address."
+        if isinstance(key, tuple) and len(key) == 2:
+            self._load_pending(key[0])
+        elif not isinstance(key, basestring):
+            return
+        elif '.' in key:
+            self._load_pending(key.split('.', 1)[0])
+        else:
+            index = key.find('_')
+            while index != -1 and self._pending:
+                self._load_pending(key[:index])
+                index = key.find('_', index + 1)
+
+    def dumps(self, format='yaml'):
+        """Return this object serialised in *format*.  The YAML format is the
+        same as ``str(config)``.
+
+        :param format: the name of a registered format.
+        :type format: str
+        :raises ValueError: if a value can not be represented in the format,
+                            such as a date in JSON or None in TOML.
+        :rtype: str, or bytes for binary formats.
+        """
+        backend = _format_for(format)
+        if backend.name == 'yaml':
+            return str(self)
+        if backend.dumps is None:
+            raise ValueError("Can not write the %s format" % backend.name)
+        self._materialize_all()
+        tree = dict((name, section._tree())
+                    for name, section in self._sections.items())
+        return backend.dumps(tree)
 
     def __str__(self):
         "Return a YAML formated string object that represents this object."
+        self._materialize_all()
         conf = []
         for section_name, section in self._sections.items():
             conf.append("\n#\n# %s\n#" % (section_name.capitalize()))
@@ -667,7 +3573,8 @@ class Config(MutableMapping):
 
     def __dir__(self):
         "Return a list of section names and the Base class attributes."
-        return dir(super(Config, self)) + list(self._sections)
+        return (dir(super(Config, self)) + list(self._sections) +
+                list(self._pending))
 
     def __getattribute__(self, y):
         """Return a section where y is the *section* name.  Else, return the
@@ -675,9 +3582,11 @@ class Config(MutableMapping):
         if y in Config._reserved:
             return super(Config, self).__getattribute__(y)
         else:
+            if y in self._pending:
+                self._materialize(y)
             if y not in self._sections:
                 if not self._strict:
-                    self._sections[y] = ConfigSection(y, {})
+                    self._add_section(y)
                 else:
                     msg = "Config object has no section '%s'" % (y)
                     raise ConfigAttributeError(msg)
@@ -695,29 +3604,57 @@ class Config(MutableMapping):
 
     def __iter__(self):
         "Iterate all of the *section_option* keys."
-        return self._lookup.__iter__()
+        self._materialize_all()
+        flat, shadowed = self._flat, self._shadowed
+        for path, section in self._paths.items():
+            if isinstance(path, basestring):
+                path = path.replace('.', '_')
+            if flat.get(path) is not section:
+                continue
+            for option in section._options:
+                key = "%s_%s" % (path, option)
+                if shadowed:
+                    found = shadowed.get(key)
+                    if found is not None and (found[0] is not section or
+                                              found[1] != option):
+                        continue
+                yield key
 
     def __len__(self):
         """Return the number of options defined in this :py:class:`Config`
         object"""
-        return len(self._lookup)
+        self._materialize_all()
+        return self._count
+
+    def __contains__(self, y):
+        "Return True if y is a *section_option* key in this object."
+        return self._resolve(y) is not None
+
+    def _items(self):
+        """Return the *section_option* items without counting them as
+        reads."""
+        items = []
+        for key in self:
+            section, option = self._resolve(key)
+            items.append((key, section._read(option)))
+        return items
 
     def __setitem__(self, x, y):
-        "Set the option value of y for x where x is *section_option*."
-        if x not in self._lookup:
-            raise ValueError("There is no section for '%s'" % x)
-        s, option = self._lookup[x]
-        if s not in self._sections:
-            self._sections[s] = ConfigSection(s, {})
-        section = self._sections[s] 
+        """Set the option value of y for x where x is *section_option* or a
+        *(section, option)* tuple."""
+        found = self._resolve(x)
+        if found is None:
+            raise ValueError("There is no section for '%s'" % (x,))
+        section, option = found
         section[option] = y
 
     def __getitem__(self, y):
-        "Return the option value for y where y is *section_option*."
-        if y not in self._lookup:
-            raise KeyError("There is no section for '%s'" % y)
-        s, option = self._lookup[y]
-        section = self._sections[s]
+        """Return the option value for y where y is *section_option* or a
+        *(section, option)* tuple."""
+        found = self._resolve(y)
+        if found is None:
+            raise KeyError("There is no section for '%s'" % (y,))
+        section, option = found
         return section[option]
 
     def __call__(self, func=None, lazy=True, hide_var_positional=False,
@@ -748,18 +3685,232 @@ class Config(MutableMapping):
         """
         if func is None:
             return functools.partial(self, lazy=lazy)
-        if lazy:
-            inner_lazy = lazy_string_cast(provide_defaults=True)(func)
-            wrapped = wraps_parameters(self,
-                                 hide_var_positional=hide_var_positional,
-                                 hide_var_keyword=hide_var_keyword)(inner_lazy)
-            return lazy_string_cast(self, provide_defaults=True)(wrapped) 
-        else:
-            wrapped = wraps_parameters(self,
-                                 hide_var_positional=hide_var_positional,
-                                 hide_var_keyword=hide_var_keyword)(func)
-            return wrapped
+        return _decorate(self, func, lazy, hide_var_positional,
+                         hide_var_keyword, self._schema)
 
 
 Config._reserved = set(dir(Config))
      
+
+
+_json_types = (bool, float, str, type(u'')) + _integer
+
+
+def _json_exact(value):
+    "Return True if JSON gives value back unchanged."
+    if type(value) is list:
+        return all(_json_exact(item) for item in value)
+    if type(value) is dict:
+        return all(type(key) in (str, type(u'')) and _json_exact(item)
+                   for key, item in value.items())
+    return value is None or type(value) in _json_types
+
+
+def _mapping_dicts(value):
+    """Return value with its mappings as dicts and its arrays as lists,
+    keeping tuples."""
+    if isinstance(value, tuple):
+        return tuple(_mapping_dicts(item) for item in value)
+    if isinstance(value, list):
+        return [_mapping_dicts(item) for item in value]
+    if isinstance(value, _array_types):
+        return value.tolist()
+    if isinstance(value, Mapping):
+        return dict((key, _mapping_dicts(item))
+                    for key, item in value.items())
+    return value
+
+
+class _StoreDumper(yaml.SafeDumper):
+    "Safe YAML dumper that tags tuples."
+
+
+class _StoreLoader(yaml.SafeLoader):
+    "Safe YAML loader that builds tagged tuples."
+
+
+_TUPLE_TAG = 'tag:yaml.org,2002:python/tuple'
+_StoreDumper.add_representer(
+    tuple, lambda dumper, value: dumper.represent_sequence(_TUPLE_TAG, value))
+_StoreLoader.add_constructor(
+    _TUPLE_TAG,
+    lambda loader, node: tuple(loader.construct_sequence(node, deep=True)))
+
+
+def _store_value(kind, value):
+    "Return the value of an option kept by :py:class:`SQLiteStore`."
+    if kind == 'json':
+        return json.loads(value)
+    return yaml.load(value, Loader=_StoreLoader)
+
+
+class SQLiteStore(object):
+    """Keep the options of a :py:class:`Config` object in an SQLite database
+    file, so that many processes can share a large configuration without
+    each one parsing all of it::
+
+        store = SQLiteStore('fleet.db')
+        store.import_yaml(['fleet.conf'])
+        config = Config(store=store)
+        config.db.host
+
+    Options are indexed by section, and a :py:class:`Config` object with a
+    store only loads a top level section, with its nested sections, the
+    first time it is used.  Each change to an option is written to the
+    database before the option is set, and the changes made in a
+    :py:meth:`Config.batch` block are committed together.  Section and
+    option names are kept as text.  Values are kept as JSON when JSON gives
+    them back unchanged, and as YAML otherwise, so tuples and mappings with
+    keys that are not strings keep their types.  Setting an option to a
+    value that YAML can not represent, such as a :py:class:`Lazy` value,
+    raises a ValueError and leaves the option unchanged.
+
+    Each write is numbered in order, so a :py:class:`Config` object can
+    pick up the changes that other processes have committed by calling
+    :py:meth:`Config.sync`, which reads only the rows written since its last
+    call.  A store may be shared by threads.  They use one connection, and
+    so one transaction, in turn.
+    """
+
+    def __init__(self, filename, autocommit=True):
+        """Open or create the store.  Each process should open the file with
+        its own store.
+
+        :param filename: the database file, or ``':memory:'``.
+        :type filename: str
+        :param autocommit: commit each change made outside of a
+                           :py:meth:`Config.batch` block.  Without it
+                           changes are committed by :py:meth:`commit` and
+                           :py:meth:`close`, which saves a disk sync for
+                           each change.
+        :type autocommit: bool
+        """
+        self.autocommit = autocommit
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS options ("
+                         "section TEXT NOT NULL, top TEXT NOT NULL, "
+                         "option TEXT NOT NULL, kind TEXT NOT NULL, "
+                         "value TEXT, seq INTEGER NOT NULL, "
+                         "PRIMARY KEY (section, option))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS options_top "
+                         "ON options (top)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS options_seq "
+                         "ON options (seq)")
+        self._db.commit()
+
+    def sections(self):
+        """Return the names of the top level sections in this store.
+
+        :rtype: list of str
+        """
+        with self._lock:
+            return [row[0] for row in
+                    self._db.execute("SELECT DISTINCT top FROM options")]
+
+    def load(self, name):
+        """Return the options of the top level section name, and of the
+        sections nested in it, as nested dicts.
+
+        :param name: name of the top level section.
+        :type name: str
+        :rtype: dict
+        """
+        tree = {}
+        with self._lock:
+            rows = self._db.execute("SELECT section, option, kind, value "
+                                    "FROM options WHERE top = ?",
+                                    (name,)).fetchall()
+        for section, option, kind, value in rows:
+            node = tree
+            for part in section.split('.'):
+                node = node.setdefault(part, {})
+            node[option] = _store_value(kind, value)
+        return tree
+
+    def sequence(self):
+        """Return the number of the last write to this store, or 0.
+
+        :rtype: int
+        """
+        with self._lock:
+            row = self._db.execute("SELECT MAX(seq) FROM options").fetchone()
+        return row[0] or 0
+
+    def changes(self, since):
+        """Return *(last, rows)* where rows lists the *(section, option,
+        value)* of each option written after the write numbered since, in
+        the order they were written, and last is the number of the last of
+        them, or since if there are none.  An option written more than once
+        is listed once, with its latest value.
+
+        :param since: a number returned by :py:meth:`sequence` or by an
+                      earlier call.
+        :type since: int
+        :rtype: tuple
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT section, option, kind, value, seq "
+                                    "FROM options WHERE seq > ? "
+                                    "ORDER BY seq", (since,)).fetchall()
+        if rows:
+            since = rows[-1][4]
+        return since, [(section, option, _store_value(kind, value))
+                       for section, option, kind, value, seq in rows]
+
+    def put(self, section, option, value):
+        """Write the value of an option.  The write is part of the current
+        transaction until :py:meth:`commit` is called.  A value that can
+        not be kept raises a ValueError before anything is written."""
+        section = str(section)
+        if _json_exact(value):
+            kind, value = 'json', json.dumps(value)
+        else:
+            try:
+                kind, value = 'yaml', yaml.dump(_mapping_dicts(value),
+                                                Dumper=_StoreDumper)
+            except yaml.YAMLError:
+                raise ValueError("Can not store %r in %s.%s" %
+                                 (value, section, option))
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO options "
+                             "(section, top, option, kind, value, seq) "
+                             "VALUES (?, ?, ?, ?, ?, (SELECT COALESCE("
+                             "MAX(seq), 0) + 1 FROM options))",
+                             (section, section.split('.', 1)[0], str(option),
+                              kind, value))
+
+    def commit(self):
+        "Commit the writes made since the last commit."
+        with self._lock:
+            self._db.commit()
+
+    def close(self):
+        "Commit and close the database."
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def import_yaml(self, filenames):
+        """Read configuration files with :py:meth:`Config.read` and write
+        all of their options into this store in a single transaction.
+
+        :param filenames: configuration files.
+        :type filenames: list of filepaths
+        :rtype: list of successfully read files.
+        """
+        config = Config()
+        read_ok = config.read(filenames)
+        for path, section in config._paths.items():
+            for option, value in section._options.items():
+                self.put(path, option, value)
+        self.commit()
+        return read_ok
+
+    def export_yaml(self):
+        """Return every option in this store as YAML, in the form of
+        ``str(config)``.
+
+        :rtype: str
+        """
+        return str(Config(store=self))
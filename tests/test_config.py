@@ -7,7 +7,11 @@ try:
     from inspect import signature
 except ImportError:
     from funcsigs import signature
+import os
+import re
+import shutil
 import sys
+import tempfile
 try:
     u = unicode
 except NameError:
@@ -56,6 +60,22 @@ bbb:
 """.strip())
 
 
+class TempDirTestCase(unittest.TestCase):
+    "A test case with a temporary directory for configuration files."
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+
 class TestConfig(unittest.TestCase):
 
     @patch('%s.open' % builtins_mod) 
@@ -237,6 +257,1249 @@ class TestConfig(unittest.TestCase):
             return b
         a = bread(4)
         self.assertEqual(a, 4)
-       
 
+    def test_section_option_view(self):
+        config = funconf.Config()
+        config.set('foo', 'bar_moo', 1)
+        config.set('foo_bar', 'moo', 2)
+        config.set('foo_bar', 'cow', 3)
+        self.assertEqual(config['foo_bar_moo'], 2)
+        self.assertEqual(config['foo_bar_cow'], 3)
+        self.assertEqual(config.foo.bar_moo, 1)
+        self.assertEqual(len(config), 2)
+        self.assertEqual(dict(config), {'foo_bar_moo': 2, 'foo_bar_cow': 3})
+        config.set('foo', 'bar_moo', 4)
+        self.assertEqual(config['foo_bar_moo'], 4)
+        self.assertEqual(dict(config), {'foo_bar_moo': 4, 'foo_bar_cow': 3})
+        self.assertTrue('foo_bar_cow' in config)
+        self.assertFalse('foo_cow' in config)
+
+    def test_section_option_view_tracks_section(self):
+        config = funconf.Config()
+        config.set('foo', 'bar', 1)
+        config.foo['moo'] = 2
+        self.assertEqual(config['foo_moo'], 2)
+        self.assertEqual(len(config), 2)
+
+    def test_section_option_tuple_keys(self):
+        config = funconf.Config()
+        config.set('a', 'b_c', 1)
+        config.set('a_b', 'c', 2)
+        self.assertEqual(config['a', 'b_c'], 1)
+        self.assertEqual(config['a_b', 'c'], 2)
+        config['a_b', 'c'] = 3
+        self.assertEqual(config.a_b.c, 3)
+        self.assertTrue(('a_b', 'c') in config)
+        self.assertRaises(KeyError, config.__getitem__, ('a', 'c'))
+
+    def test_query(self):
+        config = funconf.Config()
+        config.set('db', 'pool_size', 1)
+        config.set('db', 'pool_timeout', 2)
+        config.set('db', 'host', 'x')
+        config.set('dbreplica', 'pool_size', 3)
+        config.set('web', 'pool_size', 4)
+        self.assertEqual(config.query('db*', 'pool_*'),
+                         [('db', 'pool_size'), ('db', 'pool_timeout'),
+                          ('dbreplica', 'pool_size')])
+        self.assertEqual(config.query('db', 'host'), [('db', 'host')])
+        self.assertEqual(config.query('db', 'nope'), [])
+        self.assertEqual(config.query('*', '*_size'),
+                         [('db', 'pool_size'), ('dbreplica', 'pool_size'),
+                          ('web', 'pool_size')])
+        self.assertEqual(config.query('w?b'), [('web', 'pool_size')])
+        config.set('db', 'pool_max', 5)
+        self.assertEqual(config.query('db', 'pool_m*'), [('db', 'pool_max')])
+
+
+class TestSchema(unittest.TestCase):
+
+    def test_from_function(self):
+        def main(a, port=80, ratio=0.5, hosts=['a'], debug=False):
+            pass
+        schema = funconf.Schema(main)
+        self.assertEqual(sorted(schema), ['debug', 'hosts', 'port', 'ratio'])
+        values = dict(port='81', ratio=2, hosts='x y', debug='y', other=1)
+        schema.validate(values)
+        self.assertEqual(values, dict(port=81, ratio=2, hosts=['x', 'y'],
+                                      debug=True, other=1))
+
+    def test_validate_reports_all_errors(self):
+        model = funconf.Config()
+        model.load(TEST_CONFIG)
+        schema = funconf.Schema(model, constraints=dict(bbb_int=[7, 8]))
+        config = funconf.Config()
+        config.set('aaa', 'int', 'four')
+        config.set('aaa', 'float', 1)
+        config.set('aaa', 'list_int', [1, 'x'])
+        config.set('bbb', 'int', 9)
+        try:
+            schema.validate(config)
+        except funconf.SchemaError as exc:
+            keys = sorted(key for key, _ in exc.errors)
+        else:
+            self.fail("SchemaError not raised")
+        self.assertEqual(keys, ['aaa_int', 'aaa_list_int', 'bbb_int'])
+
+    @patch('%s.open' % builtins_mod) 
+    def test_config_validates_after_read(self, mock_open):
+        mock_open.return_value = StringIO(TEST_CONFIG)
+        schema = funconf.Schema(dict(aaa_int=0, aaa_list_str=['']))
+        config = funconf.Config('mocked.conf', schema=schema)
+        mock_open.return_value = StringIO(u("aaa:\n  int: '5'\n"))
+        config.read('mocked.conf')
+        self.assertEqual(config.aaa.int, 5)
+        mock_open.return_value = StringIO(u("aaa:\n  list_str: 5\n"))
+        self.assertRaises(funconf.SchemaError, config.read, 'mocked.conf')
+
+    def test_config_decorator_uses_schema(self):
+        schema = funconf.Schema(dict(foo_port=1),
+                                constraints=dict(foo_port=range(1, 10)))
+        config = funconf.Config(schema=schema)
+        config.set('foo', 'port', 1)
+        @config
+        def main(**k):
+            return k['foo_port']
+        with patch('funconf._conforms') as conforms:
+            self.assertEqual(main(foo_port='5'), 5)
+            self.assertEqual(main(), 5)
+            self.assertFalse(conforms.called)
+        self.assertRaises(ValueError, main, foo_port='50')
+
+
+NESTED_CONFIG = u("""
+db:
+  host: localhost
+  replica:
+    host: backup
+    pool:
+      size: 4
+      timeout: 1.5
+""".strip())
+
+
+class TestNestedSections(unittest.TestCase):
+
+    def test_load_nested(self):
+        config = funconf.Config()
+        config.load(NESTED_CONFIG)
+        self.assertEqual(config.db.host, 'localhost')
+        self.assertEqual(config.db.replica.host, 'backup')
+        self.assertEqual(config.db.replica.pool.size, 4)
+        self.assertEqual(dict(config.db.replica), {'host': 'backup'})
+        self.assertEqual(len(config), 4)
+
+    def test_path_keys(self):
+        config = funconf.Config()
+        config.load(NESTED_CONFIG)
+        self.assertEqual(config['db.replica.pool.size'], 4)
+        self.assertEqual(config['db_replica_pool_size'], 4)
+        self.assertEqual(config['db.replica.pool', 'timeout'], 1.5)
+        config['db.replica.pool.size'] = 8
+        self.assertEqual(config.db.replica.pool.size, 8)
+        self.assertRaises(KeyError, config.__getitem__, 'db.replica.nope')
+
+    def test_set_path(self):
+        config = funconf.Config()
+        config.set('a.b.c', 'd', 1)
+        self.assertEqual(config.a.b.c.d, 1)
+        self.assertEqual(len(config.a), 0)
+        self.assertTrue('b' in dir(config.a))
+        self.assertEqual(config.query('a.*'), [('a.b.c', 'd')])
+        self.assertRaises(ValueError, config.set, 'a.items', 'x', 1)
+
+    def test_str_round_trip(self):
+        config = funconf.Config()
+        config.load(NESTED_CONFIG)
+        copy = funconf.Config()
+        copy.load(str(config))
+        self.assertEqual(dict(copy), dict(config))
+        copy = funconf.Config()
+        copy.load(str(config.db.replica))
+        self.assertEqual(copy.db.replica.pool.size, 4)
+
+    def test_decorate_nested(self):
+        config = funconf.Config()
+        config.load(NESTED_CONFIG)
+        @config.db.replica.pool
+        def main(size=1, **k):
+            return size, k['timeout']
+        self.assertEqual(main(), (4, 1.5))
+        self.assertEqual(main(size='6'), (6, 1.5))
+        self.assertEqual(config.db.replica.pool.size, 6)
+
+
+class TestSubscribe(unittest.TestCase):
+
+    def test_set_delivers_change(self):
+        config = funconf.Config()
+        config.set('db', 'host', 'a')
+        changes = []
+        config.db.subscribe(changes.append)
+        config.set('db', 'host', 'b')
+        config.set('db', 'port', 2)
+        self.assertEqual(changes, [
+            [funconf.ConfigChange('db', 'host', 'a', 'b')],
+            [funconf.ConfigChange('db', 'port', funconf.MISSING, 2)]])
+
+    def test_option_filter(self):
+        config = funconf.Config()
+        changes = []
+        config.db.subscribe(changes.append, options=['port'])
+        config.set('db', 'host', 'b')
+        config.set('db', 'port', 2)
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0][0].option, 'port')
+
+    def test_batch_coalesces(self):
+        config = funconf.Config()
+        config.set('db', 'host', 'a')
+        config.set('db', 'port', 1)
+        changes = []
+        config.db.subscribe(changes.append)
+        with config.batch():
+            config.set('db', 'host', 'b')
+            config.set('db', 'host', 'c')
+            config.set('db', 'port', 2)
+            config.set('db', 'port', 1)
+            self.assertEqual(changes, [])
+        self.assertEqual(changes, [
+            [funconf.ConfigChange('db', 'host', 'a', 'c')]])
+
+    def test_batch_per_thread(self):
+        import threading
+        config = funconf.Config()
+        config.set('db', 'host', 'a')
+        changes = []
+        config.db.subscribe(changes.append)
+        with config.batch():
+            config.set('db', 'host', 'b')
+            thread = threading.Thread(target=config.set,
+                                      args=('db', 'port', 2))
+            thread.start()
+            thread.join()
+            self.assertEqual(changes, [
+                [funconf.ConfigChange('db', 'port', funconf.MISSING, 2)]])
+        self.assertEqual(changes[1],
+                         [funconf.ConfigChange('db', 'host', 'a', 'b')])
+
+    def test_batch_delivered_when_block_raises(self):
+        config = funconf.Config()
+        changes = []
+        config.db.subscribe(changes.append)
+        def fail():
+            with config.batch():
+                config.set('db', 'host', 'b')
+                raise KeyError('host')
+        self.assertRaises(KeyError, fail)
+        self.assertEqual(config.db.host, 'b')
+        self.assertEqual(changes, [
+            [funconf.ConfigChange('db', 'host', funconf.MISSING, 'b')]])
+
+    def test_load_is_one_batch(self):
+        config = funconf.Config()
+        config.load(TEST_CONFIG)
+        aaa, bbb = [], []
+        config.aaa.subscribe(aaa.append)
+        config.bbb.subscribe(bbb.append)
+        config.load(TEST_CONFIG)
+        self.assertEqual((aaa, bbb), ([], []))
+        config.load(u("aaa:\n  int: 5\n  float: 1.0\n"))
+        self.assertEqual(len(aaa), 1)
+        self.assertEqual(sorted(c.option for c in aaa[0]), ['float', 'int'])
+        self.assertEqual(bbb, [])
+
+    def test_unsubscribe(self):
+        config = funconf.Config()
+        changes = []
+        config.db.subscribe(changes.append)
+        config.db.unsubscribe(changes.append)
+        config.set('db', 'host', 'b')
+        self.assertEqual(changes, [])
+        self.assertRaises(ValueError, config.db.unsubscribe, changes.append)
+
+    def test_decorator_updates_deliver_changes(self):
+        config = funconf.Config()
+        config.set('db', 'port', 1)
+        changes = []
+        config.db.subscribe(changes.append)
+        @config.db
+        def main(port):
+            return port
+        main(port='3')
+        self.assertEqual(changes, [[funconf.ConfigChange('db', 'port', 1, 3)]])
+
+
+class TestGenerations(unittest.TestCase):
+
+    def test_changes_since(self):
+        config = funconf.Config()
+        config.load(TEST_CONFIG)
+        start = config.generation
+        self.assertEqual(config.changes_since(start), [])
+        config.set('aaa', 'int', 5)
+        config.set('bbb', 'int', 7)
+        config.set('bbb', 'float', 1.0)
+        middle = config.generation
+        self.assertEqual(middle, start + 2)
+        config.set('aaa', 'int', 6)
+        self.assertEqual(config.changes_since(start),
+                         [('bbb', 'float'), ('aaa', 'int')])
+        self.assertEqual(config.changes_since(middle), [('aaa', 'int')])
+        self.assertEqual(config.option_generation('aaa', 'int'), middle + 1)
+        self.assertEqual(config.option_generation('aaa', 'float'), start)
+
+    def test_changes_before_tracking(self):
+        config = funconf.Config()
+        config.set('a', 'b', 1)
+        config.set('c.d', 'e', 2)
+        self.assertEqual(sorted(config.changes_since(-1)),
+                         [('a', 'b'), ('c.d', 'e')])
+
+    def test_log_compaction(self):
+        config = funconf.Config()
+        config.set('a', 'b', 0)
+        start = config.generation
+        for i in range(1, 500):
+            config.a.b = i
+        self.assertEqual(config.changes_since(start), [('a', 'b')])
+        self.assertEqual(config.changes_since(config.generation), [])
+        self.assertTrue(len(config._log_gens) < 100)
+
+
+class TestDiffMerge(unittest.TestCase):
+
+    def test_diff(self):
+        a = funconf.Config()
+        a.load(TEST_CONFIG)
+        b = funconf.Config()
+        b.load(TEST_CONFIG)
+        self.assertEqual(a.diff(b), ([], [], []))
+        b.set('aaa', 'int', 5)
+        b.set('aaa', 'new', 1)
+        b.set('ccc.ddd', 'x', 1)
+        a.set('bbb', 'old', 1)
+        diff = a.diff(b)
+        self.assertEqual(diff.added, [('aaa', 'new'), ('ccc.ddd', 'x')])
+        self.assertEqual(diff.removed, [('bbb', 'old')])
+        self.assertEqual(diff.changed, [('aaa', 'int')])
+
+    def test_diff_sees_changes_after_cached_digest(self):
+        a = funconf.Config()
+        a.load(TEST_CONFIG)
+        b = funconf.Config()
+        b.load(TEST_CONFIG)
+        a.diff(b)
+        b.aaa.int = 9
+        self.assertEqual(a.diff(b).changed, [('aaa', 'int')])
+
+    def test_diff_and_merge_see_changes_in_place(self):
+        a = funconf.Config()
+        a.load(TEST_CONFIG)
+        b = funconf.Config()
+        b.load(TEST_CONFIG)
+        self.assertEqual(a.diff(b), ([], [], []))
+        b.aaa.list_int.append(3)
+        self.assertEqual(a.diff(b).changed, [('aaa', 'list_int')])
+        a.merge(b)
+        self.assertEqual(a.aaa.list_int, [1, 2, 3])
+
+    def test_merge_strategies(self):
+        def make(**options):
+            config = funconf.Config()
+            for option, value in options.items():
+                config.set('s', option, value)
+            return config
+        base = dict(l=[1, 2], d=dict(x=1, y=dict(z=1)), v=1)
+        other = make(l=[2, 3], d=dict(y=dict(w=2)), v=2, n=3)
+        config = make(**base)
+        config.merge(other)
+        self.assertEqual(dict(config.s), dict(other.s))
+        config = make(**base)
+        config.merge(other, strategy='append')
+        self.assertEqual(config.s.l, [1, 2, 2, 3])
+        self.assertEqual(config.s.d, dict(x=1, y=dict(z=1, w=2)))
+        self.assertEqual(config.s.v, 2)
+        self.assertEqual(config.s.n, 3)
+        config = make(**base)
+        config.merge(other, strategy='union')
+        self.assertEqual(config.s.l, [1, 2, 3])
+        config = make(**base)
+        config.merge(other, strategy=lambda old, new: old)
+        self.assertEqual(config.s.v, 1)
+        self.assertEqual(config.s.n, 3)
+        self.assertRaises(ValueError, config.merge, other, strategy='nope')
+
+    def test_merge_is_one_batch(self):
+        config = funconf.Config()
+        config.load(TEST_CONFIG)
+        other = funconf.Config()
+        other.set('aaa', 'int', 1)
+        other.set('aaa', 'float', 2.0)
+        changes = []
+        config.aaa.subscribe(changes.append)
+        config.merge(other)
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(len(changes[0]), 2)
+
+
+class TestFormats(TempDirTestCase):
+
+    def test_json_round_trip(self):
+        config = funconf.Config()
+        config.load(TEST_CONFIG)
+        config.load(NESTED_CONFIG)
+        path = self.write('app.json', config.dumps('json'))
+        copy = funconf.Config(path)
+        self.assertEqual(dict(copy), dict(config))
+        self.assertEqual(copy.db.replica.pool.size, 4)
+
+    def test_toml_round_trip(self):
+        config = funconf.Config()
+        config.load(TEST_CONFIG)
+        config.load(NESTED_CONFIG)
+        config.set('odd', 'key with space', [True, 1.5, "q\"uote"])
+        content = config.dumps('toml')
+        if funconf.tomllib is None:
+            self.skipTest("No TOML parser installed")
+        copy = funconf.Config()
+        copy.load(content, format='toml')
+        self.assertEqual(dict(copy), dict(config))
+
+    def test_toml_escapes_astral_characters(self):
+        config = funconf.Config()
+        config.set('foo', 'bar', u('smile \U0001F600 \u00e9\n'))
+        content = config.dumps('toml')
+        self.assertTrue('\\U0001F600' in content)
+        self.assertTrue('\\u00E9' in content)
+        if funconf.tomllib is None:
+            self.skipTest("No TOML parser installed")
+        copy = funconf.Config()
+        copy.load(content, format='toml')
+        self.assertEqual(copy.foo.bar, config.foo.bar)
+
+    def test_unsupported_values_rejected(self):
+        import datetime
+        config = funconf.Config()
+        config.set('foo', 'bar', None)
+        self.assertRaises(ValueError, config.dumps, 'toml')
+        config = funconf.Config()
+        config.set('foo', 'bar', datetime.date(2024, 1, 2))
+        self.assertRaises(ValueError, config.dumps, 'json')
+        config.set('foo', 'bar', object())
+        self.assertRaises(ValueError, config.dumps, 'toml')
+
+    def test_read_picks_format_by_extension(self):
+        paths = [self.write('a.json', '{"foo": {"bar": 1}}'),
+                 self.write('b.yml', 'foo:\n  moo: 2\n'),
+                 self.write('c.conf', 'foo:\n  cow: 3\n')]
+        config = funconf.Config()
+        self.assertEqual(config.read(paths), paths)
+        self.assertEqual(dict(config.foo), dict(bar=1, moo=2, cow=3))
+
+    def test_explicit_format(self):
+        path = self.write('settings', '{"foo": {"bar": 1}}')
+        config = funconf.Config()
+        config.read(path, format='json')
+        self.assertEqual(config.foo.bar, 1)
+        self.assertRaises(ValueError, config.read, path, format='nope')
+        self.assertRaises(ValueError, config.dumps, 'nope')
+
+    def test_register_format(self):
+        def loads(content):
+            section, option, value = content.split()
+            return {section: {option: value}}
+        funconf.register_format('spaced', loads, extensions=['.spaced'])
+        self.addCleanup(funconf._formats.pop, 'spaced')
+        self.addCleanup(funconf._extensions.pop, '.spaced')
+        config = funconf.Config(self.write('x.spaced', 'foo bar moo'))
+        self.assertEqual(config.foo.bar, 'moo')
+        self.assertRaises(ValueError, config.dumps, 'spaced')
+
+
+class TestLazy(TempDirTestCase):
+
+    def test_sections_parsed_on_first_use(self):
+        path = self.write('app.conf', TEST_CONFIG + '\n' + NESTED_CONFIG)
+        config = funconf.Config(path, lazy=True)
+        self.assertEqual(set(config._pending), set(['aaa', 'bbb', 'db']))
+        self.assertEqual(config.aaa.int, 4)
+        self.assertFalse('aaa' in config._pending)
+        self.assertTrue('bbb' in config._pending)
+        self.assertEqual(config['bbb_float'], 8.4)
+        self.assertEqual(config['db.replica.pool.size'], 4)
+        self.assertFalse(config._pending)
+
+    def test_lazy_matches_eager(self):
+        path = self.write('app.conf', TEST_CONFIG + '\n' + NESTED_CONFIG)
+        json_path = self.write('app.json', funconf.Config(path).dumps('json'))
+        for filename in (path, json_path):
+            lazy = funconf.Config(filename, lazy=True)
+            self.assertEqual(dict(lazy), dict(funconf.Config(path)))
+
+    def test_later_files_override(self):
+        first = self.write('a.conf', "foo:\n  bar: 1\n  moo: 2\n")
+        second = self.write('b.json', '{"foo": {"bar": 3}}')
+        config = funconf.Config([first, second], lazy=True)
+        self.assertEqual(config.foo.bar, 3)
+        self.assertEqual(config.foo.moo, 2)
+        config = funconf.Config(first, lazy=True)
+        config.set('foo', 'bar', 5)
+        self.assertEqual(config.foo.bar, 5)
+        self.assertEqual(config.foo.moo, 2)
+
+    def test_index_cached(self):
+        path = self.write('app.conf', TEST_CONFIG)
+        funconf.Config(path, lazy=True, cache_index=True)
+        self.assertTrue(os.path.exists(path + '.idx'))
+        with patch('funconf._scan_yaml') as scan:
+            config = funconf.Config(path, lazy=True, cache_index=True)
+            self.assertFalse(scan.called)
+        self.assertEqual(config.bbb.list_int, [3, 4])
+
+    def test_unsplittable_file_read_in_full(self):
+        path = self.write('app.conf', "a: &x\n  b: 1\nc: *x\n")
+        config = funconf.Config(path, lazy=True)
+        self.assertFalse(config._pending)
+        self.assertEqual(config.c.b, 1)
+
+    def test_sequences_and_flow_read_in_full(self):
+        for text in ("foo:\n- name: x\nbar:\n  a: 1\n",
+                     "{a: {x: 1}, b: {y: 2}}\n"):
+            path = self.write('app.conf', text)
+            config = funconf.Config(path, lazy=True)
+            self.assertFalse(config._pending)
+            self.assertEqual(dict(config), dict(funconf.Config(path)))
+
+    def test_threads_share_one_load(self):
+        import threading
+        import time
+        path = self.write('app.conf', TEST_CONFIG)
+        config = funconf.Config(path, lazy=True)
+        entry = config._pending['aaa'][0]
+        calls = []
+        def slow():
+            calls.append(1)
+            time.sleep(0.05)
+            return entry()
+        config._pending['aaa'] = [slow]
+        results = []
+        read = lambda: results.append(config.aaa.int)
+        threads = [threading.Thread(target=read) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [4] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertFalse('aaa' in config._pending)
+
+
+class TestMappedRead(TempDirTestCase):
+
+    @patch('funconf._MMAP_THRESHOLD', 0)
+    def test_large_files_mapped(self):
+        import mmap
+        path = self.write('app.conf', TEST_CONFIG + '\n' + NESTED_CONFIG)
+        expected = dict(funconf.Config(path))
+        json_path = self.write('app.json', funconf.Config(path).dumps('json'))
+        for filename in (path, json_path):
+            self.assertEqual(dict(funconf.Config(filename)), expected)
+            lazy = funconf.Config(filename, lazy=True)
+            entry = lazy._pending['aaa'][0]
+            self.assertFalse(isinstance(entry.args[0], mmap.mmap))
+            self.assertEqual(len(entry.args[0]), entry.args[2])
+            # Pending sections keep their bytes once the file changes.
+            with open(filename, 'w') as f:
+                f.write('')
+            self.assertEqual(dict(lazy), expected)
+
+    def test_small_files_read(self):
+        path = self.write('app.conf', TEST_CONFIG)
+        config = funconf.Config(path, lazy=True)
+        self.assertTrue(isinstance(config._pending['aaa'][0].args[0], bytes))
+        self.assertEqual(config.aaa.int, 4)
+
+
+class TestFreeze(unittest.TestCase):
+
+    def test_freeze_section(self):
+        config = funconf.Config()
+        config.load(NESTED_CONFIG)
+        config.set('db', 'tags', ['a', 'b'])
+        config.set('db', 'extra', {'x': [1]})
+        db = config.db.freeze()
+        self.assertEqual(db.host, 'localhost')
+        self.assertEqual(db.replica.pool.size, 4)
+        self.assertEqual(db.tags, ('a', 'b'))
+        self.assertEqual(db.extra['x'], (1,))
+        self.assertEqual(hash(db), hash(config.db.freeze()))
+        self.assertRaises(AttributeError, setattr, db, 'host', 'x')
+
+    def test_freeze_config(self):
+        config = funconf.Config()
+        config.load(TEST_CONFIG)
+        frozen = config.freeze()
+        self.assertEqual(frozen.bbb.list_int, (3, 4))
+        self.assertTrue(type(frozen.aaa) is type(frozen.bbb))
+        config.aaa.int = 5
+        self.assertEqual(frozen.aaa.int, 4)
+        self.assertEqual(config.freeze().aaa.int, 5)
+        self.assertNotEqual(hash(frozen), hash(config.freeze()))
+
+    def test_snapshots_compare_with_names(self):
+        config = funconf.Config()
+        config.set('a', 'x', 1)
+        config.set('b', 'y', 1)
+        a, b = config.a.freeze(), config.b.freeze()
+        self.assertNotEqual(a, b)
+        self.assertNotEqual(hash(a), hash(b))
+        self.assertNotEqual(a, (1,))
+        self.assertEqual(a, config.a.freeze())
+
+    def test_field_names_escaped(self):
+        config = funconf.Config()
+        config.set('a', 'max-size', 1)
+        config.set('a', 'class', 2)
+        frozen = config.a.freeze()
+        self.assertEqual((frozen.max_size, frozen.class_), (1, 2))
+        config.set('a', 'max_size', 3)
+        self.assertRaises(ValueError, config.a.freeze)
+        config.set('b', '1st', 1)
+        self.assertRaises(ValueError, config.b.freeze)
+
+    def test_classes_bounded(self):
+        config = funconf.Config()
+        with patch('funconf._FROZEN_MAX', 2):
+            for name in ('a', 'b', 'c'):
+                config.set('s', name, 1)
+                config.s.freeze()
+            self.assertEqual(len(funconf._frozen_classes), 2)
+
+    def test_frozen_dict(self):
+        frozen = funconf.FrozenDict(a=1)
+        self.assertEqual(frozen, {'a': 1})
+        self.assertEqual(hash(frozen), hash(funconf.FrozenDict(a=1)))
+        import operator
+        self.assertRaises(TypeError, operator.setitem, frozen, 'a', 2)
+
+
+class TestOverride(unittest.TestCase):
+
+    def test_override_scoped(self):
+        config = funconf.Config()
+        config.load(TEST_CONFIG)
+        config.load(NESTED_CONFIG)
+        with config.override(aaa_int=5, overrides={'db.replica.host': 'x'}):
+            self.assertEqual(config.aaa.int, 5)
+            self.assertEqual(config['aaa_int'], 5)
+            self.assertEqual(config.db.replica['host'], 'x')
+            self.assertEqual(dict(config.aaa)['int'], 5)
+            with config.override(aaa_int=6):
+                self.assertEqual(config.aaa.int, 6)
+            self.assertEqual(config.aaa.int, 5)
+            config.aaa.int = 7
+            self.assertEqual(config.aaa.int, 7)
+        self.assertEqual(config.aaa.int, 4)
+        self.assertEqual(config.db.replica.host, 'backup')
+        self.assertRaises(ValueError, config.override, aaa_nope=1)
+
+    def test_override_not_seen_by_other_threads(self):
+        import threading
+        config = funconf.Config()
+        config.set('foo', 'bar', 1)
+        seen = []
+        with config.override(foo_bar=2):
+            thread = threading.Thread(target=lambda: seen.append(config.foo.bar))
+            thread.start()
+            thread.join()
+            self.assertEqual(config.foo.bar, 2)
+        self.assertEqual(seen, [1])
+
+    def test_override_writes_not_seen_by_other_contexts(self):
+        try:
+            import contextvars
+        except ImportError:
+            self.skipTest("contextvars is not available")
+        config = funconf.Config()
+        config.set('foo', 'bar', 1)
+        config.set('foo', 'moo', 1)
+        with config.override(foo_bar=2, foo_moo=5):
+            child = contextvars.copy_context()
+            def task():
+                config.foo.bar = 3
+                return config.foo.bar, config.foo.moo
+            self.assertEqual(child.run(task), (3, 5))
+            self.assertEqual(config.foo.bar, 2)
+            config.foo.bar = 4
+            self.assertEqual(child.run(lambda: config.foo.bar), 3)
+            with config.override(foo_moo=6):
+                config.foo.bar = 7
+                self.assertEqual(config.foo.moo, 6)
+            self.assertEqual(config.foo.bar, 7)
+        self.assertEqual(config.foo.bar, 1)
+
+    def test_decorated_function_writes_to_override(self):
+        config = funconf.Config()
+        config.set('foo', 'bar', 1)
+        @config
+        def main(**k):
+            return k['foo_bar']
+        with config.override(foo_bar=2):
+            self.assertEqual(main(), 2)
+            self.assertEqual(main(foo_bar='3'), 3)
+            self.assertEqual(config.foo.bar, 3)
+        self.assertEqual(config.foo.bar, 1)
+        self.assertEqual(main(), 1)
+
+
+class TestSQLiteStore(TempDirTestCase):
+
+    def test_sections_loaded_on_demand(self):
+        path = self.write('app.conf', TEST_CONFIG + '\n' + NESTED_CONFIG)
+        store = funconf.SQLiteStore(os.path.join(self.tmp, 'app.db'))
+        self.assertEqual(store.import_yaml(path), [path])
+        config = funconf.Config(store=store)
+        self.assertEqual(set(config._pending), set(['aaa', 'bbb', 'db']))
+        self.assertEqual(config.bbb.list_int, [3, 4])
+        self.assertEqual(config['db.replica.pool.size'], 4)
+        self.assertTrue('aaa' in config._pending)
+        self.assertEqual(dict(config), dict(funconf.Config(path)))
+
+    def test_write_through(self):
+        import datetime
+        filename = os.path.join(self.tmp, 'app.db')
+        config = funconf.Config(store=funconf.SQLiteStore(filename))
+        config.set('db', 'host', 'db1')
+        with config.batch():
+            config.set('db.replica', 'port', 5433)
+            config.set('db', 'since', datetime.date(2024, 1, 2))
+        other = funconf.Config(store=funconf.SQLiteStore(filename))
+        self.assertEqual(other.db.host, 'db1')
+        self.assertEqual(other.db.replica.port, 5433)
+        self.assertEqual(other.db.since, datetime.date(2024, 1, 2))
+        copy = funconf.Config()
+        copy.load(funconf.SQLiteStore(filename).export_yaml())
+        self.assertEqual(dict(copy), dict(other))
+
+    def test_sync(self):
+        filename = os.path.join(self.tmp, 'app.db')
+        first = funconf.Config(store=funconf.SQLiteStore(filename))
+        first.set('db', 'host', 'x')
+        first.set('db', 'port', 1)
+        second = funconf.Config(store=funconf.SQLiteStore(filename))
+        self.assertEqual(second.db.host, 'x')
+        events = []
+        second.db.subscribe(events.extend)
+        first.set('db', 'host', 'y')
+        first.set('web', 'port', 80)
+        self.assertEqual(second.db.host, 'x')
+        self.assertEqual(second.sync(), [('db', 'host')])
+        self.assertEqual(second.db.host, 'y')
+        self.assertEqual(second.web.port, 80)
+        self.assertEqual([(e.option, e.old, e.new) for e in events],
+                         [('host', 'x', 'y')])
+        self.assertEqual(second.sync(), [])
+        self.assertEqual(first.sync(), [])
+        self.assertRaises(ValueError, funconf.Config().sync)
+
+    def test_types_kept(self):
+        filename = os.path.join(self.tmp, 'app.db')
+        config = funconf.Config(store=funconf.SQLiteStore(filename))
+        config.set('foo', 'pair', (1, [2, (3,)]))
+        config.set('foo', 'codes', {200: 'ok'})
+        config.set('foo', 'names', {'a': [1, 2.5, None, True]})
+        other = funconf.Config(store=funconf.SQLiteStore(filename))
+        self.assertEqual(other.foo.pair, (1, [2, (3,)]))
+        self.assertEqual(other.foo.codes, {200: 'ok'})
+        self.assertEqual(other.foo.names, {'a': [1, 2.5, None, True]})
+
+    def test_unstorable_value_rejected(self):
+        filename = os.path.join(self.tmp, 'app.db')
+        config = funconf.Config(store=funconf.SQLiteStore(filename))
+        config.set('foo', 'bar', 1)
+        self.assertRaises(ValueError, config.set, 'foo', 'bar',
+                          funconf.Lazy(int, ['foo.bar']))
+        self.assertRaises(ValueError, config.set, 'foo', 'bar', object())
+        self.assertEqual(config.foo.bar, 1)
+        other = funconf.Config(store=funconf.SQLiteStore(filename))
+        self.assertEqual(other.foo.bar, 1)
+
+    def test_shared_by_threads(self):
+        import threading
+        store = funconf.SQLiteStore(os.path.join(self.tmp, 'app.db'))
+        config = funconf.Config(store=store)
+        threads = [threading.Thread(target=config.set,
+                                    args=('foo', 'bar%s' % i, i))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        other = funconf.Config(store=store)
+        self.assertEqual(dict(other.foo), dict(('bar%s' % i, i)
+                                               for i in range(4)))
+
+    def test_without_autocommit(self):
+        filename = os.path.join(self.tmp, 'app.db')
+        store = funconf.SQLiteStore(filename, autocommit=False)
+        config = funconf.Config(store=store)
+        config.set('foo', 'bar', 1)
+        with patch.object(store, 'commit') as commit:
+            config.set('foo', 'bar', 2)
+            self.assertFalse(commit.called)
+        store.close()
+        other = funconf.Config(store=funconf.SQLiteStore(filename))
+        self.assertEqual(other.foo.bar, 2)
+
+
+class TestImmutable(TempDirTestCase):
+
+    def test_values_frozen(self):
+        config = funconf.Config(immutable=True)
+        config.load(TEST_CONFIG)
+        config.set('foo', 'map', {'a': [1]})
+        self.assertEqual(config.aaa.list_int, (1, 2))
+        self.assertEqual(config.foo.map['a'], (1,))
+        @config
+        def main(**k):
+            return k['aaa_list_int']
+        self.assertEqual(main(), (1, 2))
+        self.assertEqual(main(aaa_list_int='5 6'), (5, 6))
+        self.assertEqual(main(aaa_list_int=[7]), [7])
+        self.assertEqual(config.aaa.list_int, (7,))
+
+    def test_schema_accepts_tuples(self):
+        schema = funconf.Schema(dict(aaa_list_int=[0]))
+        config = funconf.Config(schema=schema, immutable=True)
+        config.load(TEST_CONFIG)
+        schema.validate(config)
+        self.assertRaises(funconf.SchemaError, schema.validate,
+                          dict(aaa_list_int=(1, 2)))
+
+    def test_round_trip(self):
+        config = funconf.Config(immutable=True)
+        config.load(TEST_CONFIG)
+        config.set('foo', 'map', {'a': [1]})
+        for text, format in ((str(config), 'yaml'),
+                             (config.dumps('json'), 'json')):
+            copy = funconf.Config(immutable=True)
+            copy.load(text, format=format)
+            self.assertEqual(copy.aaa.list_int, (1, 2))
+            self.assertEqual(copy.foo.map['a'], (1,))
+
+    def test_store_round_trip(self):
+        path = os.path.join(self.tmp, 'conf.db')
+        store = funconf.SQLiteStore(path)
+        config = funconf.Config(store=store, immutable=True)
+        config.set('foo', 'map', {'a': [1]})
+        config.set('foo', 'list', [1, 2])
+        store.close()
+        store = funconf.SQLiteStore(path)
+        config = funconf.Config(store=store, immutable=True)
+        self.assertEqual(config.foo.map['a'], (1,))
+        self.assertEqual(config.foo.list, (1, 2))
+        store.close()
+
+    def test_merge(self):
+        config = funconf.Config(immutable=True)
+        config.set('foo', 'list', [1, 2])
+        config.set('foo', 'map', {'a': [1]})
+        other = funconf.Config(immutable=True)
+        other.set('foo', 'list', [3])
+        other.set('foo', 'map', {'b': [2]})
+        config.merge(other, 'union')
+        self.assertEqual(config.foo.list, (1, 2, 3))
+        self.assertEqual(dict(config.foo.map), {'a': (1,), 'b': (2,)})
+
+
+class TestDiscovery(TempDirTestCase):
+
+    def test_paths_expanded_and_deduplicated(self):
+        with open(os.path.join(self.tmp, 'app.conf'), 'w') as f:
+            f.write("foo:\n  bar: 1\n")
+        with patch.dict(os.environ, {'HOME': self.tmp,
+                                     'APP_DIR': self.tmp}):
+            read = funconf.Config().read(['~/app.conf', '$APP_DIR/./app.conf'])
+        self.assertEqual(read, ['$APP_DIR/./app.conf'])
+
+    def test_repeated_path_read_last(self):
+        a = self.write('a.conf', "foo:\n  bar: 1\n")
+        b = self.write('b.conf', "foo:\n  bar: 2\n")
+        config = funconf.Config()
+        self.assertEqual(config.read([a, b, a]), [b, a])
+        self.assertEqual(config.foo.bar, 1)
+
+    def test_missing_paths_not_probed_again(self):
+        path = os.path.join(self.tmp, 'late.conf')
+        self.assertEqual(funconf.Config().read(path), [])
+        with open(path, 'w') as f:
+            f.write("foo:\n  bar: 1\n")
+        with patch('%s.open' % builtins_mod) as mock_open:
+            self.assertEqual(funconf.Config().read(path), [])
+            self.assertFalse(mock_open.called)
+        funconf.clear_read_cache()
+        self.assertEqual(funconf.Config().read(path), [path])
+
+    def test_only_missing_paths_remembered(self):
+        import errno
+        path = os.path.join(self.tmp, 'locked.conf')
+        with open(path, 'w') as f:
+            f.write("foo:\n  bar: 1\n")
+        denied = IOError(errno.EACCES, 'Permission denied')
+        with patch('%s.open' % builtins_mod, side_effect=denied):
+            self.assertEqual(funconf.Config().read(path), [])
+        self.assertEqual(funconf.Config().read(path), [path])
+
+    def test_missing_paths_bounded(self):
+        with patch('funconf._MISSING_MAX', 3):
+            for i in range(5):
+                funconf.Config().read(os.path.join(self.tmp, '%s.conf' % i))
+            self.assertEqual(list(funconf._missing),
+                             [os.path.join(self.tmp, '%s.conf' % i)
+                              for i in (2, 3, 4)])
+        funconf.clear_read_cache()
+
+
+INTERPOLATED_CONFIG = u("""
+net:
+  host: db.local
+  port: 5432
+db:
+  url: postgres://${net.host}:${net_port}/app
+  port: ${net.port}
+  literal: $${net.host}
+""".strip())
+
+
+class TestInterpolation(unittest.TestCase):
+
+    def test_references_resolved(self):
+        config = funconf.Config(interpolate=True)
+        config.load(INTERPOLATED_CONFIG)
+        self.assertEqual(config.db.url, 'postgres://db.local:5432/app')
+        self.assertEqual(config['db_port'], 5432)
+        self.assertEqual(config.db.literal, '${net.host}')
+        self.assertEqual(config.references()[('db', 'url')],
+                         set([('net', 'host'), ('net', 'port')]))
+        self.assertTrue('${net.host}' in str(config))
+
+    def test_dependents_recomputed_on_set(self):
+        config = funconf.Config(interpolate=True)
+        config.load(INTERPOLATED_CONFIG)
+        self.assertEqual(config.db.port, 5432)
+        config.net.host = 'db2.local'
+        self.assertEqual(config.db.url, 'postgres://db2.local:5432/app')
+        self.assertTrue(('db', 'port') in config._resolved)
+        config.db.url = 'sqlite://'
+        self.assertEqual(config.db.url, 'sqlite://')
+
+    def test_decorated_function_keeps_references(self):
+        config = funconf.Config(interpolate=True)
+        config.load(INTERPOLATED_CONFIG)
+        @config
+        def main(db_port, **k):
+            return db_port
+        self.assertEqual(main(), 5432)
+        config.net.port = 6543
+        self.assertEqual(main(), 6543)
+
+    def test_cycles_and_missing_references(self):
+        config = funconf.Config(interpolate=True)
+        self.assertRaises(ValueError, config.load,
+                          "a:\n  x: ${b.y}\nb:\n  y: ${a.x}\n")
+        config = funconf.Config(interpolate=True)
+        self.assertRaises(ValueError, config.load, "a:\n  x: ${a.nope}\n")
+
+    def test_dependents_reported_as_changed(self):
+        config = funconf.Config(interpolate=True)
+        config.load(INTERPOLATED_CONFIG)
+        config.set('app', 'dsn', '${db.url}')
+        changes = []
+        config.app.subscribe(changes.append)
+        generation = config.generation
+        config.net.host = 'db2.local'
+        self.assertEqual(sorted(config.changes_since(generation)),
+                         [('app', 'dsn'), ('db', 'url'), ('net', 'host')])
+        self.assertEqual(changes[0][0].new, 'postgres://db2.local:5432/app')
+        with config.batch():
+            config.net.port = 1
+            config.net.port = 2
+        self.assertEqual(len(changes), 2)
+        self.assertEqual(changes[1][0].old, 'postgres://db2.local:5432/app')
+        self.assertEqual(changes[1][0].new, 'postgres://db2.local:2/app')
+
+    def test_threads_resolving_same_option(self):
+        import threading
+        started, done = threading.Event(), threading.Event()
+        calls = []
+        def slow():
+            calls.append(1)
+            if len(calls) == 1:
+                started.set()
+                done.wait(5)
+            return 'v'
+        config = funconf.Config(interpolate=True)
+        config.set('b', 'y', funconf.Lazy(slow))
+        config.set('a', 'x', '${b.y}')
+        results = []
+        thread = threading.Thread(target=lambda: results.append(config.a.x))
+        thread.start()
+        started.wait(5)
+        try:
+            self.assertEqual(config.a.x, 'v')
+        finally:
+            done.set()
+            thread.join()
+        self.assertEqual(results, ['v'])
+
+    def test_cache_kept_under_unrelated_override(self):
+        config = funconf.Config(interpolate=True)
+        config.load(INTERPOLATED_CONFIG)
+        config.set('other', 'x', 1)
+        self.assertEqual(config.db.port, 5432)
+        config._resolved[('db', 'port')] = 'cached'
+        with config.override(other_x=2):
+            self.assertEqual(config.db.port, 'cached')
+        with config.override(net_port=1):
+            self.assertEqual(config.db.port, 1)
+            self.assertEqual(config.db.url, 'postgres://db.local:1/app')
+        self.assertEqual(config.db.port, 'cached')
+        self.assertEqual(config.db.url, 'postgres://db.local:5432/app')
+
+    def test_reads_counted(self):
+        config = funconf.Config()
+        config.load(TEST_CONFIG)
+        config.track_access()
+        config.aaa.int
+        config.aaa['int']
+        config['aaa_float']
+        stats = config.access_stats()
+        self.assertEqual(stats[('aaa', 'int')].reads, 2)
+        self.assertEqual(stats[('aaa', 'float')].reads, 1)
+        self.assertTrue(stats[('aaa', 'int')].last_read is not None)
+        self.assertEqual(stats[('aaa', 'list_str')],
+                         funconf.AccessStats(0, None))
+        @config
+        def main(**k):
+            return k['bbb_int']
+        main()
+        self.assertTrue(config.access_stats()[('bbb', 'int')].reads >= 1)
+        config.track_access(0)
+
+    def test_internal_reads_not_counted(self):
+        config = funconf.Config()
+        config.set('db', 'host', 'a')
+        config.set('db', 'port', 1)
+        config.track_access()
+        @config.db
+        def main(host, port):
+            return host
+        main()
+        'host' in config.db
+        'db_host' in config
+        str(config)
+        config.db.freeze()
+        config.diff(config)
+        stats = config.access_stats()
+        self.assertEqual(stats[('db', 'host')].reads, 1)
+        self.assertEqual(stats[('db', 'port')].reads, 1)
+        config.track_access(0)
+
+    def test_sampled_and_stopped(self):
+        tracking = funconf._tracking
+        config = funconf.Config()
+        config.set('foo', 'bar', 1)
+        config.track_access(sample=4)
+        for _ in range(8):
+            config.foo.bar
+        self.assertEqual(config.access_stats()[('foo', 'bar')].reads, 8)
+        config.track_access(0)
+        config.foo.bar
+        self.assertEqual(config.access_stats()[('foo', 'bar')].reads, 8)
+        self.assertEqual(funconf._tracking, tracking)
+
+
+class TestLazyValues(unittest.TestCase):
+
+    def test_memoised_until_input_changes(self):
+        calls = []
+        def compile(pattern):
+            calls.append(pattern)
+            return re.compile(pattern)
+        config = funconf.Config()
+        config.set('log', 'pattern', r'^\d+$')
+        config.set('log', 'regex', funconf.Lazy(compile, ['pattern']))
+        self.assertTrue(config.log.regex.match('42'))
+        self.assertTrue(config.log['regex'] is config.log.regex)
+        self.assertEqual(len(calls), 1)
+        config.set('log', 'pattern', r'^[a-z]+$')
+        self.assertTrue(config.log.regex.match('abc'))
+        self.assertEqual(len(calls), 2)
+        config.set('other', 'x', 1)
+        config.log.regex
+        self.assertEqual(len(calls), 2)
+
+    def test_decorated_default(self):
+        config = funconf.Config()
+        config.set('net', 'base', 8000)
+        config.set('net', 'port', funconf.Lazy(lambda b: b + 80,
+                                                ['net_base']))
+        @config.net
+        def main(base, port):
+            return port
+        self.assertEqual(main(), 8080)
+        self.assertEqual(main(), 8080)
+        self.assertTrue(isinstance(config.net._options['port'],
+                                   funconf.Lazy))
+        config.set('net', 'base', 9000)
+        self.assertEqual(main(), 9080)
+        self.assertEqual(config.freeze().net.port, 9080)
+
+    def test_missing_input(self):
+        config = funconf.Config()
+        config.set('a', 'x', funconf.Lazy(len, ['nope']))
+        self.assertRaises(ValueError, getattr, config.a, 'x')
+
+    def test_input_changed_through_reference(self):
+        config = funconf.Config(interpolate=True)
+        config.set('base', 'host', 'b')
+        config.set('db', 'host', '${base.host}')
+        config.set('db', 'upper', funconf.Lazy(lambda h: h.upper(), ['host']))
+        self.assertEqual(config.db.upper, 'B')
+        config.set('base', 'host', 'zz')
+        self.assertEqual(config.db.upper, 'ZZ')
+
+    def test_memo_kept_under_unrelated_override(self):
+        calls = []
+        def double(x):
+            calls.append(x)
+            return x * 2
+        config = funconf.Config()
+        config.set('a', 'x', 1)
+        config.set('a', 'y', funconf.Lazy(double, ['x']))
+        config.set('a', 'z', funconf.Lazy(lambda y: y + 1, ['y']))
+        config.set('b', 'other', 0)
+        self.assertEqual(config.a.z, 3)
+        with config.override(b_other=1):
+            self.assertEqual(config.a.y, 2)
+            self.assertEqual(len(calls), 1)
+        with config.override(a_x=5):
+            self.assertEqual(config.a.y, 10)
+            self.assertEqual(config.a.z, 11)
+        self.assertEqual(config.a.z, 3)
+        self.assertEqual(len(calls), 3)
+
+
+class TestDerive(unittest.TestCase):
+
+    def setUp(self):
+        self.built = []
+        self.closed = []
+
+    def pool(self, host, port):
+        self.built.append((host, port))
+        return object()
+
+    def test_rebuilt_on_listed_change(self):
+        config = funconf.Config()
+        config.load("db:\n  host: a\n  port: 1\n  timeout: 5\n")
+        derive = lambda: config.db.derive(self.pool, ['host', 'port'],
+                                          close=self.closed.append)
+        pool = derive()
+        self.assertTrue(derive() is pool)
+        config.set('db', 'timeout', 10)
+        config.set('db', 'port', 1)
+        self.assertTrue(derive() is pool)
+        config.set('db', 'port', 2)
+        new = derive()
+        self.assertFalse(new is pool)
+        self.assertEqual(self.closed, [pool])
+        config.load("db:\n  host: b\n")
+        self.assertFalse(derive() is new)
+        self.assertEqual(self.built, [('a', 1), ('a', 2), ('b', 2)])
+
+    def test_rebuilt_on_referenced_change(self):
+        config = funconf.Config(interpolate=True)
+        config.load("base:\n  host: a\ndb:\n  host: ${base.host}\n"
+                    "  port: 1\n")
+        pool = config.db.derive(self.pool, ['host', 'port'])
+        config.set('base', 'host', 'b')
+        self.assertFalse(config.db.derive(self.pool, ['host', 'port']) is pool)
+        self.assertEqual(self.built, [('a', 1), ('b', 1)])
+
+    def test_standalone_and_override(self):
+        section = funconf.ConfigSection('db', {'host': 'a', 'port': 1})
+        pool = section.derive(self.pool)
+        self.assertTrue(section.derive(self.pool) is pool)
+        section['host'] = 'b'
+        self.assertFalse(section.derive(self.pool) is pool)
+        self.assertRaises(KeyError, section.derive, self.pool, ['nope'])
+        config = funconf.Config()
+        config.load("db:\n  host: a\n  port: 1\n")
+        pool = config.db.derive(self.pool)
+        with config.override(db_host='c'):
+            self.assertFalse(config.db.derive(self.pool) is pool)
+        self.assertTrue(config.db.derive(self.pool) is pool)
+        self.assertEqual(self.built[-2:], [('a', 1), ('c', 1)])
+
+
+class TestArrays(TempDirTestCase):
+
+    def test_numeric_lists_stored_as_arrays(self):
+        import array
+        import json
+        config = funconf.Config(arrays=True)
+        config.load("w:\n  ints: [4, 2, 55]\n  floats: [1.0, 2.5]\n"
+                    "  names: [a, b]\n  mixed: [1, a]\n  empty: []\n"
+                    "  numbers: [1, 2.5]\n")
+        self.assertEqual(config.w.ints, array.array('q', [4, 2, 55]))
+        self.assertEqual(config.w.floats, array.array('d', [1.0, 2.5]))
+        self.assertEqual(config.w.names, ['a', 'b'])
+        self.assertEqual(config.w.mixed, [1, 'a'])
+        self.assertEqual(config.w.numbers, [1, 2.5])
+        self.assertTrue(type(config.w.numbers[0]) is int)
+        self.assertEqual(config.w.empty, [])
+        copy = funconf.Config()
+        copy.load(str(config))
+        self.assertEqual(copy.w.ints, [4, 2, 55])
+        self.assertEqual(json.loads(config.dumps('json'))['w']['floats'],
+                         [1.0, 2.5])
+        self.assertEqual(config.freeze().w.ints, (4, 2, 55))
+
+    def test_cast_in_bulk(self):
+        import array
+        config = funconf.Config(arrays=True)
+        config.set('shard', 'weights', [1, 2])
+        @config.shard
+        def main(weights):
+            return weights
+        self.assertEqual(main(weights='3 4,5'), array.array('q', [3, 4, 5]))
+        self.assertRaises(ValueError, main, weights='3 x')
+        caster = funconf.caster_for(array.array('d'))
+        self.assertEqual(caster('k', '1 2.5'), array.array('d', [1.0, 2.5]))
+        self.assertFalse(caster is funconf.caster_for(array.array('q')))
+
+    def test_store_and_immutable(self):
+        import array
+        path = os.path.join(self.tmp, 'conf.db')
+        store = funconf.SQLiteStore(path)
+        config = funconf.Config(store=store, arrays=True)
+        config.set('w', 'ints', [1, 2])
+        store.close()
+        store = funconf.SQLiteStore(path)
+        config = funconf.Config(store=store, arrays=True)
+        self.assertEqual(config.w.ints, array.array('q', [1, 2]))
+        store.close()
+        config = funconf.Config(arrays=True, immutable=True)
+        config.set('w', 'ints', [1, 2])
+        self.assertEqual(config.w.ints, (1, 2))
 
+    def test_diff_sees_arrays_changed_in_place(self):
+        config = funconf.Config(arrays=True)
+        config.set('w', 'ints', [1, 2])
+        other = funconf.Config(arrays=True)
+        other.set('w', 'ints', [1, 2])
+        self.assertEqual(config.diff(other).changed, [])
+        other.w.ints[0] = 5
+        self.assertEqual(config.diff(other).changed, [('w', 'ints')])
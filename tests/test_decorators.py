@@ -275,4 +275,225 @@ class TestLazyStringCast(unittest.TestCase):
             return a
         self.assertEqual(main(), False)
 
+    def test_cast_registered_types(self):
+        import datetime
+        import decimal
+        model = dict(d=decimal.Decimal('1.5'),
+                     t=datetime.datetime(2000, 1, 1),
+                     day=datetime.date(2000, 1, 1))
+        @funconf.lazy_string_cast(model)
+        def main(**k):
+            return k
+        k = main(d='2.25', t='2013-04-05T06:07:08', day='2013-04-05')
+        self.assertEqual(k['d'], decimal.Decimal('2.25'))
+        self.assertEqual(k['t'], datetime.datetime(2013, 4, 5, 6, 7, 8))
+        self.assertEqual(k['day'], datetime.date(2013, 4, 5))
+        self.assertRaises(ValueError, main, t='tomorrow')
+
+    def test_cast_enum_and_path(self):
+        try:
+            import enum
+            import pathlib
+        except ImportError:
+            return
+        Colour = enum.Enum('Colour', 'red green')
+        @funconf.lazy_string_cast(dict(c=Colour.red, p=pathlib.Path('.')))
+        def main(**k):
+            return k
+        self.assertEqual(main(c='green')['c'], Colour.green)
+        self.assertEqual(main(c='1')['c'], Colour.red)
+        self.assertEqual(main(p='/tmp')['p'], pathlib.Path('/tmp'))
+        self.assertRaises(ValueError, main, c='blue')
+
+    def test_cast_unregistered_passes_through(self):
+        @funconf.lazy_string_cast(dict(a=(1, 2), b=None))
+        def main(**k):
+            return k
+        self.assertEqual(main(a='abc', b='x'), dict(a='abc', b='x'))
+
+    def test_register_caster(self):
+        class Point(object):
+            pass
+        funconf.register_caster(Point,
+                lambda default: lambda key, value: value.split(','))
+        self.addCleanup(funconf._compiled.clear)
+        self.addCleanup(funconf._casters.pop, Point)
+        @funconf.lazy_string_cast(dict(p=Point()))
+        def main(**k):
+            return k
+        self.assertEqual(main(p='1,2')['p'], ['1', '2'])
+        self.assertTrue(funconf.caster_for(3) is funconf.caster_for(4))
+
+    def test_nested_list_casters(self):
+        funconf._compiled.clear()
+        self.addCleanup(funconf._compiled.clear)
+        self.assertEqual(funconf.caster_for([['a']])('k', '1 2'),
+                         [['1'], ['2']])
+        self.assertEqual(funconf.caster_for([[1]])('k', '1 2'), [[1], [2]])
+
+
+@funconf.lazy_string_cast(dict(a=1))
+def module_main(a, b=2):
+    return a, b
+
+
+class TestDecoratedFunction(unittest.TestCase):
+
+    def test_plan_built_at_decoration(self):
+        conf = dict(a=1)
+        @funconf.wraps_parameters(conf)
+        def main(**k):
+            return k
+        conf['b'] = 2
+        self.assertEqual(list(signature(main).parameters), ['a', 'k'])
 
+    def test_real_function(self):
+        import inspect
+        import pickle
+        self.assertTrue(inspect.isfunction(module_main))
+        self.assertTrue(pickle.loads(pickle.dumps(module_main)) is module_main)
+        self.assertEqual(module_main('3'), (3, 2))
+
+    def test_signature_before_call(self):
+        @funconf.lazy_string_cast(dict(a=1))
+        def main(a, b=2):
+            "doc"
+            return a, b
+        self.assertEqual(main.__name__, 'main')
+        self.assertEqual(main.__doc__, 'doc')
+        self.assertEqual(signature(main).parameters['a'].default, 1)
+        self.assertEqual(main('3'), (3, 2))
+
+    def test_cast_decorated_function(self):
+        @funconf.lazy_string_cast
+        @funconf.wraps_parameters(dict(a=1))
+        def main(a=0):
+            return a
+        self.assertEqual(main('5'), 5)
+
+    def test_method(self):
+        class Foo(object):
+            @funconf.lazy_string_cast
+            def main(self, a=1):
+                return self, a
+        foo = Foo()
+        self.assertEqual(foo.main('2'), (foo, 2))
+        self.assertEqual(Foo.main(foo, a='3'), (foo, 3))
+        self.assertEqual(list(signature(foo.main).parameters), ['a'])
+
+
+class TestAdaptiveCast(unittest.TestCase):
+
+    def test_fast_path_and_deopt(self):
+        @funconf.lazy_string_cast
+        def main(a=1, b=2.0):
+            return a, b
+        for i in range(20):
+            self.assertEqual(main(i, b=1.5), (i, 1.5))
+        profile = main.profile
+        self.assertTrue(profile.fast)
+        self.assertTrue(profile.fast_calls > 0)
+        self.assertEqual(main('7', b='2'), (7, 2.0))
+        self.assertFalse(profile.fast)
+        self.assertEqual(profile.deopts, 1)
+
+    def test_model_defaults_kept(self):
+        @funconf.lazy_string_cast(dict(a=5))
+        def main(a, b=2):
+            return a, b
+        for i in range(20):
+            self.assertEqual(main(b=i), (5, i))
+        self.assertFalse(main.profile.fast)
+        for i in range(20):
+            self.assertEqual(main(i), (i, 2))
+        self.assertTrue(main.profile.fast)
+        self.assertRaises(TypeError, main, 1, 2, 3)
+
+
+class TestMethodBinding(unittest.TestCase):
+
+    def test_self_passed_through(self):
+        config = funconf.Config()
+        config.set('foo', 'a', 3)
+        class Service(object):
+            @config.foo
+            def main(self, a, **k):
+                return self, a
+        service, other = Service(), Service()
+        self.assertEqual(service.main(), (service, 3))
+        self.assertEqual(service.main('5'), (service, 5))
+        self.assertEqual(other.main(a='6'), (other, 6))
+        self.assertEqual(list(signature(service.main).parameters), ['a'])
+        self.assertTrue(service.main.__func__ is other.main.__func__)
+
+    def test_method_fast_path(self):
+        class Service(object):
+            @funconf.lazy_string_cast(dict(a=1))
+            def main(self, a, b=2):
+                return self, a, b
+        service = Service()
+        for i in range(20):
+            self.assertEqual(service.main(i, b=i), (service, i, i))
+        self.assertTrue(service.main.profile.fast)
+        self.assertEqual(service.main(b='4'), (service, 1, 4))
+
+    def test_self_not_bound(self):
+        class Service(object):
+            @funconf.wraps_parameters(dict(a=1))
+            @funconf.lazy_string_cast(dict(a=1))
+            def main(self, a, *args):
+                return self, a, args
+        service = Service()
+        self.assertEqual(list(signature(Service.main).parameters),
+                         ['self', 'a', 'args'])
+        self.assertEqual(service.main('2', 3), (service, 2, (3,)))
+        self.assertEqual(Service.main('x', a='4'), ('x', 4, ()))
+        @funconf.lazy_string_cast(dict(self=1))
+        def main(self):
+            return self
+        self.assertEqual(main('5'), 5)
+
+
+class TestRecordCaster(unittest.TestCase):
+
+    def test_mapping_and_sequence_records(self):
+        def load(host='', port=80, weights=[0.0], debug=False):
+            pass
+        caster = funconf.record_caster(load)
+        self.assertEqual(caster.columns, ['host', 'port', 'weights', 'debug'])
+        rows = [dict(host='a', port='81', weights='1 2.5', debug='yes'),
+                ['b', '82', '3', 'no'],
+                dict(host='c', port=83, extra='x')]
+        self.assertEqual(list(caster.cast_stream(rows)), [
+            dict(host='a', port=81, weights=[1.0, 2.5], debug=True),
+            dict(host='b', port=82, weights=[3.0], debug=False),
+            dict(host='c', port=83, extra='x')])
+        caster = funconf.record_caster(dict(port=80, host=''),
+                                       columns=['port'], provide_defaults=True)
+        self.assertEqual(caster.cast(['8080']), dict(port=8080, host=''))
+        self.assertEqual(caster.cast(dict(port='5', extra='x')),
+                         dict(port=5, host='', extra='x'))
+
+    def test_config_section_model(self):
+        config = funconf.Config()
+        config.set('db', 'port', 5432)
+        config.set('db', 'pool', [1])
+        caster = funconf.record_caster(config.db, columns=['port', 'pool'])
+        self.assertEqual(caster.cast(('1', '2 3')), dict(port=1, pool=[2, 3]))
+
+    def test_errors(self):
+        model = dict(port=80)
+        rows = [dict(port='1'), dict(port='x'), ['1', '2'], dict(port='3')]
+        stream = funconf.record_caster(model).cast_stream(rows)
+        self.assertEqual(next(stream), dict(port=1))
+        self.assertRaises(ValueError, next, stream)
+        caster = funconf.record_caster(model, errors='skip')
+        self.assertEqual(list(caster.cast_stream(rows)),
+                         [dict(port=1), dict(port=3)])
+        self.assertEqual(caster.errors, [])
+        caster = funconf.record_caster(model, errors='collect')
+        self.assertEqual(len(list(caster.cast_stream(rows))), 2)
+        self.assertEqual([e[:2] for e in caster.errors],
+                         [(1, rows[1]), (2, rows[2])])
+        self.assertRaises(ValueError, funconf.record_caster, model,
+                          errors='ignore')